@@ -5,5 +5,19 @@ import os
 sys.path.insert(0, os.path.abspath(
     os.path.join(os.path.dirname(__file__), '..')))
 
-from tikapp import TikaApp
+from tikapp import TikaApp, daemon
+from tikapp.admission import MemoryScheduler
+from tikapp.backends import TikaServerBackend
+from tikapp.batch import expand_inputs, read_processed
+from tikapp.cache import TikaCache
+from tikapp.corpus import CorpusRunner
+from tikapp.results import TikaFileResult, TikaResult
+from tikapp.signatures import detect as detect_signature
+from tikapp.staging import Staging
+from tikapp.utils import iter_text
+
+try:
+    from tikapp.aio import AsyncTikaApp
+except SyntaxError:
+    AsyncTikaApp = None
 from tikapp.exceptions import *
@@ -20,6 +20,7 @@ limitations under the License.
 from __future__ import unicode_literals
 import magic
 import os
+import tempfile
 import timeit
 
 from context import TikaApp
@@ -27,6 +28,7 @@ from context import TikaApp
 profiling_path = os.path.realpath(os.path.dirname(__file__))
 test_zip = os.path.join(profiling_path, "files", "lorem_ipsum.txt.zip")
 test_txt = os.path.join(profiling_path, "files", "lorem_ipsum.txt")
+cds_dir = os.path.join(tempfile.gettempdir(), "tikapp-cds")
 
 try:
     TIKA_APP_JAR = os.environ["TIKA_APP_JAR"]
@@ -35,6 +37,12 @@ except KeyError:
 
 
 def tika_content_type():
+    tika_client = TikaApp(file_jar=TIKA_APP_JAR, fast_detection=False)
+    output = tika_client.detect_content_type(path=test_zip)
+    return output
+
+
+def fast_content_type():
     tika_client = TikaApp(file_jar=TIKA_APP_JAR)
     output = tika_client.detect_content_type(path=test_zip)
     return output
@@ -64,6 +72,19 @@ def tika_extract_only_content(memory=None):
     return output
 
 
+def tika_extract_only_content_fast_startup():
+    tika_client = TikaApp(file_jar=TIKA_APP_JAR, jvm_profile="fast-startup")
+    output = tika_client.extract_only_content(path=test_zip)
+    return output
+
+
+def tika_extract_only_content_cds():
+    tika_client = TikaApp(
+        file_jar=TIKA_APP_JAR, jvm_profile="fast-startup", cds_dir=cds_dir)
+    output = tika_client.extract_only_content(path=test_zip)
+    return output
+
+
 if __name__ == "__main__":
     """Results:
         (Python 2)
@@ -86,8 +107,14 @@ if __name__ == "__main__":
         "tika_content_type",
         "tika_detect_language",
         "magic_content_type",
+        "fast_content_type",
         "tika_extract_all_content",
-        "tika_extract_only_content"]
+        "tika_extract_only_content",
+        "tika_extract_only_content_fast_startup",
+        "tika_extract_only_content_cds"]
+
+    # Build the CDS archive before the measure
+    tika_extract_only_content_cds()
 
     for function in functions:
         t = timeit.Timer(
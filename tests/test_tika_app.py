@@ -18,24 +18,50 @@ limitations under the License.
 """
 
 import base64
+import io
 import logging
+import mmap
 import os
 import six
+import shutil
+import sys
+import tempfile
+import threading
+import time
 import unittest
+import zipfile
 
 import mailparser
 import simplejson as json
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
 
 from context import (
+    AsyncTikaApp,
+    CorpusRunner,
+    MemoryScheduler,
+    Staging,
     TikaApp,
+    TikaCache,
+    TikaAppDaemonError,
     TikaAppError,
     TikaAppFilePathError,
     TikaAppJarError,
+    TikaAppOutOfMemoryError,
+    TikaAppTimeoutError,
+    TikaFileResult,
+    TikaResult,
+    TikaServerBackend,
+    daemon,
+    detect_signature,
+    expand_inputs,
+    iter_text,
+    read_processed,
 )
 
 
 unittest_path = os.path.realpath(os.path.dirname(__file__))
 test_txt = os.path.join(unittest_path, 'files', 'test.txt')
+test_lorem = os.path.join(unittest_path, 'files', 'lorem_ipsum.txt')
 test_zip = os.path.join(unittest_path, 'files', 'test.zip')
 test_pdf = os.path.join(unittest_path, 'files', 'pdf1.pdf')
 mail_test_1 = os.path.join(unittest_path, 'files', 'mail_test_1')
@@ -43,6 +69,138 @@ TIKA_APP_JAR = os.environ.get(
     "TIKA_APP_JAR", None) or "/opt/tika/tika-app-1.18.jar"
 
 
+class TikaServerStandIn(BaseHTTPRequestHandler):
+    """Stand-in of Tika server endpoints, for backend tests. """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def read_body(self):
+        if self.headers.get("Transfer-Encoding") != "chunked":
+            return self.rfile.read(int(self.headers["Content-Length"]))
+
+        body = b""
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+            body += self.rfile.read(size)
+            self.rfile.readline()
+            if not size:
+                return body
+
+    def do_GET(self):
+        self.reply(b"This is Tika Server.")
+
+    def do_PUT(self):
+        body = self.read_body()
+        content_type = "application/zip" if body.startswith(b"PK") \
+            else "text/plain"
+        metadata = {"Content-Type": content_type}
+
+        if self.path == "/tika":
+            self.reply(body)
+        elif self.path == "/detect/stream":
+            self.reply(content_type.encode("utf-8"))
+        elif self.path == "/language/stream":
+            self.reply(b"en")
+        elif self.path == "/meta":
+            self.reply(json.dumps(metadata).encode("utf-8"))
+        elif self.path == "/rmeta/text":
+            metadata["X-TIKA:content"] = body.decode("latin-1")
+            self.reply(json.dumps([metadata]).encode("utf-8"))
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def reply(self, body):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        # Like a server that drops the idle keep-alive connections
+        if getattr(self.server, "close_after_reply", False):
+            self.close_connection = True
+
+
+class TestTikaServerBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), TikaServerStandIn)
+        t = threading.Thread(target=self.server.serve_forever)
+        t.daemon = True
+        t.start()
+        self.backend = TikaServerBackend(
+            url="http://127.0.0.1:{}".format(self.server.server_port))
+
+    def tearDown(self):
+        self.backend.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_process(self):
+        with open(test_txt, 'rb') as f:
+            raw = f.read()
+
+        self.assertEqual(self.backend.process(["-t"], path=test_txt), raw)
+        self.assertEqual(
+            self.backend.process(["-t"], chunks=iter([raw[:3], raw[3:]])),
+            raw)
+        self.assertEqual(
+            self.backend.process(["-d"], objectInput=io.BytesIO(raw)),
+            b"text/plain")
+        self.assertEqual(
+            self.backend.process(["-l"], path=test_txt), b"en")
+
+        result = json.loads(self.backend.process(
+            ["-J", "-t", "-r"], path=test_zip).decode("utf-8"))
+        self.assertEqual(result[0]["Content-Type"], "application/zip")
+
+        with self.assertRaises(TikaAppError):
+            self.backend.process(["--help"], path=test_txt)
+
+    def test_tika_app(self):
+        tika = TikaApp(file_jar=TIKA_APP_JAR, backend=self.backend,
+                       fast_detection=False)
+
+        with open(test_zip, 'rb') as f:
+            raw = f.read()
+
+        self.assertEqual(
+            tika.detect_content_type(data=raw), "application/zip")
+        self.assertEqual(tika.detect_language(path=test_txt), "en")
+        self.assertIn("test", tika.extract_only_content(path=test_txt))
+        self.assertIsInstance(
+            tika.extract_only_metadata(data=raw, convert_to_obj=True), dict)
+        self.assertIsInstance(
+            tika.extract_all_content(path=test_zip, convert_to_obj=True),
+            list)
+
+    def test_closed_connections(self):
+        self.server.close_after_reply = True
+        tika = TikaApp(file_jar=TIKA_APP_JAR, backend=self.backend)
+
+        for i in range(4):
+            raw = "text {}".format(i).encode("ascii")
+            self.assertEqual(
+                tika.extract_only_content(data=raw), "text {}".format(i))
+            self.assertEqual(
+                tika.extract_only_content(objectInput=io.BytesIO(raw)),
+                "text {}".format(i))
+
+        temp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp, u"r\u00e9sum\u00e9 \u6587\u4ef6.txt")
+            shutil.copy(test_txt, path)
+            with open(test_txt, 'rb') as f:
+                self.assertEqual(
+                    self.backend.process(["-t"], path=path), f.read())
+        finally:
+            shutil.rmtree(temp)
+
+
 class TestTikaApp(unittest.TestCase):
 
     def setUp(self):
@@ -146,15 +304,33 @@ class TestTikaApp(unittest.TestCase):
         self.assertEqual(result, "application/zip")
 
         with open(test_zip) as f:
-            with self.assertRaises(TikaAppError):
-                self.tika.detect_content_type(objectInput=f)
+            self.assertEqual(
+                result, self.tika.detect_content_type(objectInput=f))
 
         result = self.tika.detect_content_type(path=test_txt)
         self.assertEqual(result, "text/plain")
 
         with open(test_txt) as f:
-            with self.assertRaises(TikaAppError):
-                self.tika.detect_content_type(objectInput=f)
+            self.assertEqual(
+                result, self.tika.detect_content_type(objectInput=f))
+
+    def test_fast_detection(self):
+        tika = TikaApp(file_jar=TIKA_APP_JAR, fast_detection=False)
+
+        for path in (test_zip, test_pdf, mail_test_1, test_txt):
+            with open(path, 'rb') as f:
+                raw = f.read()
+
+            result = tika.detect_content_type(path=path)
+            self.assertEqual(
+                result, self.tika.detect_content_type(path=path))
+            self.assertEqual(
+                result, self.tika.detect_content_type(data=raw))
+
+        self.assertEqual(detect_signature(path=test_zip), "application/zip")
+        self.assertEqual(detect_signature(path=test_pdf), "application/pdf")
+        self.assertEqual(detect_signature(path=mail_test_1), "message/rfc822")
+        self.assertIsNone(detect_signature(path=test_txt))
 
     def test_extract_only_content(self):
         result = self.tika.extract_only_content(path=test_txt)
@@ -187,6 +363,679 @@ class TestTikaApp(unittest.TestCase):
             result["Content-Length"], result_obj["Content-Length"])
         self.assertDictEqual(result, result_obj)
 
+    def test_pool(self):
+        with TikaApp(file_jar=TIKA_APP_JAR, pool_size=2,
+                     pool_max_jobs=2) as tika:
+            for _ in range(3):
+                result = tika.extract_only_content(path=test_txt)
+                self.assertEqual(
+                    result, self.tika.extract_only_content(path=test_txt))
+
+            with open(test_txt) as f:
+                result = tika.detect_language(objectInput=f)
+            self.assertEqual(result, "en")
+
+            result = tika.extract_all_content(
+                path=test_txt, convert_to_obj=True)
+            self.assertIsInstance(result, list)
+            self.assertIn("X-TIKA:content", result[0])
+
+    def test_batch_extract(self):
+        paths = [test_txt, test_zip, test_txt]
+        results = list(self.tika.batch_extract(paths, mode="all"))
+        self.assertEqual([r.path for r in results], paths)
+
+        for r in results:
+            self.assertIsNone(r.error)
+            self.assertIsInstance(r.content, list)
+
+        self.assertEqual(results[1].content[0]["Content-Type"],
+                         "application/zip")
+
+        with self.assertRaises(TikaAppError):
+            self.tika.batch_extract(paths, mode="fake")
+
+        with self.assertRaises(TikaAppFilePathError):
+            list(self.tika.batch_extract("/tmp/fake_rand_dir"))
+
+    def test_expand_inputs(self):
+        files = os.path.join(unittest_path, 'files')
+        paths = list(expand_inputs(
+            [test_txt, os.path.join(files, '*.txt'), files, "/nope"]))
+
+        self.assertEqual(paths[0], test_txt)
+        self.assertIn(test_lorem, paths)
+        self.assertIn(test_pdf, paths)
+        self.assertEqual(paths[-1], "/nope")
+        self.assertEqual(
+            len(set(os.path.normpath(i) for i in paths)), len(paths))
+
+        temp = tempfile.mkdtemp()
+        output = os.path.join(temp, "output.ndjson")
+        self.assertEqual(read_processed(output), set())
+
+        try:
+            with open(output, "w") as f:
+                f.write(json.dumps({"path": test_txt, "error": None}) + "\n")
+                f.write(json.dumps({"path": test_pdf, "error": None}) + "\n")
+                f.write('{"path": "/trunc')
+            self.assertEqual(read_processed(output), {test_txt, test_pdf})
+        finally:
+            shutil.rmtree(temp)
+
+    def test_corpus(self):
+        temp = tempfile.mkdtemp()
+        corpus = os.path.join(temp, "corpus")
+        manifest = os.path.join(temp, "manifest")
+        os.mkdir(corpus)
+
+        for name in ("a.txt", "b.txt", "c.txt"):
+            shutil.copy(test_txt, os.path.join(corpus, name))
+
+        def run(file_jar=TIKA_APP_JAR):
+            tika = TikaApp(file_jar=file_jar)
+            with CorpusRunner(tika, manifest, workers=2) as runner:
+                return sorted((os.path.basename(r.input), r.status)
+                              for r in runner.run([corpus]))
+
+        try:
+            self.assertEqual(
+                run(), [("a.txt", "new"), ("b.txt", "new"), ("c.txt", "new")])
+            self.assertEqual(run(), [])
+
+            with open(os.path.join(corpus, "a.txt"), "ab") as f:
+                f.write(b"changed")
+            os.remove(os.path.join(corpus, "c.txt"))
+            self.assertEqual(
+                run(), [("a.txt", "changed"), ("c.txt", "removed")])
+
+            # A copy of the same Jar, only touched, changes nothing
+            jar = os.path.join(temp, "tika-app.jar")
+            shutil.copy(TIKA_APP_JAR, jar)
+            os.utime(jar, (0, 0))
+            self.assertEqual(run(jar), [])
+
+            # Another Jar invalidates all entries
+            with zipfile.ZipFile(jar, "a") as z:
+                z.comment = b"another build"
+            self.assertEqual(
+                run(jar), [("a.txt", "stale"), ("b.txt", "stale")])
+            self.assertEqual(run(jar), [])
+
+        finally:
+            shutil.rmtree(temp)
+
+    def test_analyze(self):
+        result = self.tika.analyze(path=test_zip)
+        self.assertEqual(result.content_type, "application/zip")
+        self.assertEqual(result.metadata["resourceName"], "test.zip")
+        self.assertNotIn("X-TIKA:content", result.metadata)
+        self.assertEqual(len(result.embedded), 1)
+
+        result = self.tika.analyze(path=test_txt, language_fallback=True)
+        self.assertEqual(result.content_type, "text/plain")
+        self.assertIn("test", result.content)
+        self.assertEqual(result.language, "en")
+
+    def test_cache(self):
+        temp = tempfile.mkdtemp()
+        cache = TikaCache(os.path.join(temp, "cache.db"), max_entries=1)
+
+        try:
+            tika = TikaApp(file_jar=TIKA_APP_JAR, cache=cache)
+
+            # The output of a failed run is not cached
+            tika._command = lambda *args: [
+                sys.executable, "-c", "import sys; sys.exit(1)"]
+            self.assertFalse(tika.extract_only_content(path=test_txt))
+            self.assertEqual(cache.stats["entries"], 0)
+            del tika._command
+
+            result = tika.extract_only_content(path=test_txt)
+            self.assertIn("test", result)
+            self.assertEqual(result, tika.extract_only_content(path=test_txt))
+
+            with open(test_txt) as f:
+                self.assertEqual(
+                    result, tika.extract_only_content(objectInput=f))
+
+            self.assertEqual(cache.stats["hits"], 2)
+            self.assertEqual(cache.stats["misses"], 2)
+
+            tika.detect_content_type(path=test_zip)
+            self.assertEqual(cache.stats["entries"], 1)
+
+        finally:
+            cache.close()
+            shutil.rmtree(temp)
+
+    def test_cache_eviction(self):
+        temp = tempfile.mkdtemp()
+        path = os.path.join(temp, "cache.db")
+        cache = TikaCache(path, max_bytes=100)
+
+        try:
+            for i in range(200):
+                cache.set("key {}".format(i), b"x" * 10)
+                cache.get("key 0")
+
+            # The least recently used entries are evicted
+            self.assertEqual(cache.stats["entries"], 10)
+            self.assertEqual(cache.stats["bytes"], 100)
+            self.assertEqual(cache.get("key 0"), "x" * 10)
+            self.assertEqual(cache.get("key 199"), "x" * 10)
+            self.assertIsNone(cache.get("key 190"))
+
+            # A replaced entry is counted once
+            cache.set("key 0", b"y" * 50)
+            self.assertEqual(cache.stats["bytes"], 100)
+            self.assertEqual(cache.stats["entries"], 6)
+            cache.close()
+
+            cache = TikaCache(path, max_bytes=100)
+            tika = TikaApp(file_jar=TIKA_APP_JAR, cache=cache)
+            result = tika.extract_only_content(path=test_lorem)
+            self.assertGreater(len(result.encode("utf-8")), 100)
+            self.assertEqual(cache.stats["entries"], 0)
+            self.assertEqual(cache.stats["bytes"], 0)
+
+        finally:
+            cache.close()
+            shutil.rmtree(temp)
+
+    def test_extract_many(self):
+        with open(test_txt, 'rb') as f:
+            txt = f.read()
+        with open(test_pdf, 'rb') as f:
+            pdf = f.read()
+
+        with open(test_zip, 'rb') as f:
+            raw_zip = f.read()
+
+        payloads = [
+            txt, base64.b64encode(pdf).decode("ascii"), raw_zip, txt]
+        results = list(self.tika.extract_many(payloads, max_count=3))
+        self.assertEqual(len(results), 4)
+
+        for raw, documents in zip([txt, pdf, raw_zip, txt], results):
+            expected = self.tika.extract_all_content(
+                data=raw, convert_to_obj=True)
+            self.assertEqual(len(documents), len(expected))
+            self.assertNotIn(
+                "X-TIKA:embedded_resource_path", documents[0])
+
+            # The container first, then its embedded documents
+            for document, other in zip(documents, expected):
+                for key in ("Content-Type", "X-TIKA:content",
+                            "X-TIKA:embedded_resource_path"):
+                    self.assertEqual(document.get(key), other.get(key))
+
+    def test_scheduler(self):
+        scheduler = MemoryScheduler(
+            "1g", overhead="256m", buckets=[("1m", "256m"), ("10m", "512m")])
+
+        self.assertEqual(scheduler.heap(1024), "256m")
+        self.assertEqual(scheduler.heap(2 * 1024 ** 2), "512m")
+        self.assertEqual(scheduler.heap(20 * 1024 ** 2, "2g"), "2g")
+        self.assertEqual(scheduler.heap(None), "1g")
+
+        tika = TikaApp(file_jar=TIKA_APP_JAR, scheduler=scheduler)
+        results = []
+
+        def extract():
+            results.append(tika.extract_only_content(path=test_lorem))
+
+        with scheduler.admit("512m"):
+            t = threading.Thread(target=extract)
+            t.start()
+            t.join(0.5)
+            # 512m + 256m already charged: the JVM waits
+            self.assertEqual(scheduler.stats["waiting"], 1)
+            self.assertEqual(results, [])
+
+        t.join()
+        self.assertEqual(
+            results, [self.tika.extract_only_content(path=test_lorem)])
+        self.assertEqual(scheduler.stats["used"], 0)
+
+        # The streams wait too
+        def stream():
+            results.append("".join(tika.iter_content(path=test_lorem)))
+
+        with scheduler.admit("512m"):
+            t = threading.Thread(target=stream)
+            t.start()
+            t.join(0.5)
+            self.assertEqual(scheduler.stats["waiting"], 1)
+            self.assertEqual(len(results), 1)
+
+        t.join()
+        self.assertEqual(results[1], results[0])
+        self.assertEqual(scheduler.stats["used"], 0)
+
+        # First in, first admitted: the small JVMs don't overtake a big one
+        order = []
+
+        def admit(name, heap):
+            with scheduler.admit(heap):
+                order.append(name)
+
+        with scheduler.admit("256m"):
+            big = threading.Thread(target=admit, args=("big", "768m"))
+            big.start()
+            time.sleep(0.2)
+            small = threading.Thread(target=admit, args=("small", "256m"))
+            small.start()
+            small.join(0.2)
+            # 256m + 256m + 256m fit, but the big JVM is first in queue
+            self.assertEqual(order, [])
+            self.assertEqual(scheduler.stats["waiting"], 2)
+
+        big.join()
+        small.join()
+        self.assertEqual(order, ["big", "small"])
+
+    def test_heap_ladder(self):
+        tika = TikaApp(
+            file_jar=TIKA_APP_JAR, heap_ladder=["256m", "1g", "4g"])
+
+        self.assertEqual(tika._heap(), "256m")
+        self.assertEqual(tika._next_heap("256m"), "1g")
+        self.assertEqual(tika._next_heap("512m"), "1g")
+        self.assertIsNone(tika._next_heap("4g"))
+
+        # JVM options go before -jar
+        command = tika._command(["-t"], "1g")
+        self.assertLess(command.index("-Xmx1g"), command.index("-jar"))
+
+        self.assertEqual(
+            tika.extract_only_content(path=test_txt),
+            self.tika.extract_only_content(path=test_txt))
+
+    def test_timeout(self):
+        events = []
+        tika = TikaApp(file_jar=TIKA_APP_JAR, stats_hook=events.append)
+        temp = tempfile.gettempdir()
+        files = set(os.listdir(temp))
+
+        with self.assertRaises(TikaAppTimeoutError):
+            tika.extract_only_content(path=test_pdf, timeout=0.01)
+
+        with self.assertRaises(TikaAppTimeoutError):
+            tika.detect_content_type(
+                payload=base64.b64encode(b"no magic").decode("ascii"),
+                deadline=time.time() - 1)
+
+        self.assertEqual(set(os.listdir(temp)), files)
+        self.assertEqual(tika.runs.stats["timed_out"], 1)
+        self.assertTrue(events[0]["timed_out"])
+
+        self.assertEqual(
+            tika.extract_only_content(path=test_txt, timeout=120),
+            self.tika.extract_only_content(path=test_txt))
+        self.assertEqual(tika.runs.stats["calls"], 2)
+
+        # The streams of a wedged JVM are killed at the timeout of instance
+        tika = TikaApp(file_jar=TIKA_APP_JAR, timeout=0.5)
+        tika._command = lambda *args: [
+            sys.executable, "-c", "import time; time.sleep(60)"]
+        start = time.time()
+
+        with self.assertRaises(TikaAppTimeoutError):
+            list(tika.iter_content(path=test_txt))
+
+        with self.assertRaises(TikaAppTimeoutError):
+            list(tika.iter_all_content(path=test_txt, timeout=0.2))
+
+        self.assertLess(time.time() - start, 10)
+        self.assertEqual(tika.runs.stats["timed_out"], 2)
+
+    def test_staging(self):
+        staging = Staging(max_free=1)
+
+        for raw in (b"first payload, the longest", b"second"):
+            path = staging.stage([raw[:5], raw[5:]])
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), raw)
+            self.assertEqual(staging.stats["staged"], 1)
+
+            self.assertEqual(
+                self.tika.detect_content_type(path=path),
+                self.tika.detect_content_type(data=raw))
+
+            self.assertTrue(staging.release(path))
+            self.assertEqual(staging.stats["staged"], 0)
+
+        self.assertFalse(staging.release(path))
+        staging.close()
+        self.assertEqual(staging.stats["free"], 0)
+
+    def test_coalescing(self):
+        with open(test_txt, 'rb') as f:
+            raw = f.read()
+
+        # Coalescing is opt-in: by default the input is only streamed
+        self.tika.extract_only_content(data=raw)
+        self.assertEqual(self.tika.coalescing.stats["calls"], 0)
+
+        tika = TikaApp(file_jar=TIKA_APP_JAR, coalesce=True)
+        results = []
+
+        # A slow JVM, so that the calls overlap
+        run = tika._run
+
+        def slow_run(*args, **kwargs):
+            time.sleep(0.5)
+            return run(*args, **kwargs)
+
+        tika._run = slow_run
+
+        def extract(i):
+            if i % 2:
+                results.append(tika.extract_only_content(path=test_txt))
+            else:
+                results.append(tika.extract_only_content(data=raw))
+
+        threads = [threading.Thread(target=extract, args=(i,))
+                   for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(
+            results, [self.tika.extract_only_content(path=test_txt)] * 6)
+
+        stats = tika.coalescing.stats
+        self.assertGreater(stats["coalesced"], 0)
+        self.assertEqual(stats["calls"] + stats["coalesced"], 6)
+        self.assertEqual(stats["in_flight"], 0)
+
+    def test_lazy_results(self):
+        tika = TikaApp(file_jar=TIKA_APP_JAR, lazy_results=True)
+
+        result = tika.extract_only_content(path=test_txt)
+        self.assertIsInstance(result, TikaResult)
+        self.assertIsInstance(result.raw, six.binary_type)
+        self.assertEqual(
+            result.text, self.tika.extract_only_content(path=test_txt))
+        self.assertEqual(six.text_type(result), result.text)
+
+        # Without convert_to_obj the output is not decoded
+        result = tika.extract_all_content(path=test_txt)
+        self.assertIsNone(result._text)
+        self.assertIsNone(tika.extract_only_metadata(path=test_txt)._text)
+        self.assertIsInstance(result.json, list)
+        self.assertIs(result.json, result.json)
+
+        self.assertEqual(
+            TikaResult(u"e\u0301 ".encode("utf-8")).text, u"\u00e9")
+        self.assertFalse(TikaResult(b" \n"))
+        self.assertIsNone(TikaResult(b"").json)
+
+    def test_spill(self):
+        text = self.tika.extract_only_content(path=test_txt)
+
+        tika = TikaApp(file_jar=TIKA_APP_JAR, spill_size=len(text) * 2)
+        self.assertEqual(tika.extract_only_content(path=test_txt), text)
+
+        tika.spill_size = 1
+        result = tika.extract_only_content(path=test_txt)
+        self.assertIsInstance(result, TikaFileResult)
+        self.assertEqual(six.text_type(result), text)
+
+        # The truth value doesn't decode the output
+        result = tika.extract_all_content(path=test_txt)
+        self.assertIsInstance(result, TikaFileResult)
+        self.assertIsNone(result._text)
+        self.assertTrue(result)
+        self.assertIsNone(result._text)
+        self.assertFalse(TikaFileResult(b"\n \t"))
+
+        chunks = iter(lambda: result.read(3), b"")
+        self.assertEqual(b"".join(chunks), result.mmap[:])
+        self.assertEqual(result.read(), b"")
+
+    @unittest.skipIf(six.PY2, "asyncio needs Python 3")
+    def test_async(self):
+        import asyncio
+
+        tika = AsyncTikaApp(file_jar=TIKA_APP_JAR, concurrency=2)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        with open(test_zip, 'rb') as f:
+            payload = base64.b64encode(f.read())
+
+        try:
+            results = loop.run_until_complete(asyncio.gather(
+                tika.extract_only_content(path=test_txt),
+                tika.detect_language(path=test_txt),
+                tika.detect_content_type(payload=payload),
+                tika.extract_all_content(path=test_zip, convert_to_obj=True),
+            ))
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+        self.assertIn("test", results[0])
+        self.assertEqual(results[1], "en")
+        self.assertEqual(results[2], "application/zip")
+        self.assertEqual(results[3][0]["Content-Type"], "application/zip")
+
+    def test_map(self):
+        with open(test_zip, 'rb') as f:
+            raw = f.read()
+
+        inputs = [test_txt, raw, {"payload": base64.b64encode(raw)},
+                  "/tmp/fake_rand_file"]
+        results = list(self.tika.map(
+            inputs, method="detect_content_type", workers=2))
+
+        self.assertEqual([r.index for r in results], [0, 1, 2, 3])
+        self.assertEqual(results[0].result, "text/plain")
+        self.assertEqual(results[1].result, "application/zip")
+        self.assertEqual(results[2].result, "application/zip")
+        self.assertIsInstance(results[3].error, TikaAppFilePathError)
+
+        results = list(self.tika.imap_unordered(
+            (test_txt for _ in range(4)), workers=2, in_flight=2))
+        self.assertEqual(sorted(r.index for r in results), [0, 1, 2, 3])
+
+        with self.assertRaises(TikaAppError):
+            self.tika.map(inputs, method="generic")
+
+    def test_stream_payload(self):
+        with open(test_txt, 'rb') as f:
+            raw = f.read()
+
+        result = self.tika.extract_only_content(path=test_txt)
+
+        # MIME base64 with newlines
+        payload = base64.encodestring(raw) if six.PY2 else \
+            base64.encodebytes(raw)
+        self.assertEqual(result, self.tika.extract_only_content(
+            payload=payload))
+        self.assertEqual(result, self.tika.extract_only_content(
+            objectInput=io.BytesIO(raw)))
+
+        result = self.tika.extract_all_content(
+            objectInput=io.BytesIO(raw), convert_to_obj=True)
+        self.assertIn("test", result[0]["X-TIKA:content"])
+
+    def test_data(self):
+        with open(test_zip, 'rb') as f:
+            raw = f.read()
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            for data in (raw, bytearray(raw), memoryview(raw), m):
+                self.assertEqual(
+                    self.tika.detect_content_type(data=data),
+                    "application/zip")
+                result = self.tika.extract_all_content(
+                    data=data, convert_to_obj=True)
+                self.assertEqual(result[1]["resourceName"], "test.txt")
+        finally:
+            m.close()
+
+        with open(test_txt, 'rb') as f:
+            result = self.tika.extract_only_content(data=f.read())
+        self.assertEqual(
+            result, self.tika.extract_only_content(path=test_txt))
+
+    def test_iter_content(self):
+        result = self.tika.extract_only_content(path=test_lorem)
+        chunks = list(self.tika.iter_content(path=test_lorem, chunk_size=512))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), result)
+
+        chunks = self.tika.iter_content(path=test_lorem, max_chars=100)
+        self.assertEqual("".join(chunks), result[:100])
+
+        with open(test_lorem, 'rb') as f:
+            chunks = self.tika.iter_content(data=f.read(), max_bytes=100)
+            self.assertLessEqual(len("".join(chunks)), 100)
+
+        # Hangul jamo are composed also when split between chunks
+        raw = u" \u1100\u1161\u11a8 \u1100\u1161 ".encode("utf-8")
+        chunks = [raw[i:i + 1] for i in range(len(raw))]
+        self.assertEqual("".join(iter_text(chunks)), u"\uac01 \uac00")
+
+    def test_iter_all_content(self):
+        result = self.tika.extract_all_content(
+            path=test_zip, convert_to_obj=True)
+        documents = list(self.tika.iter_all_content(
+            path=test_zip, chunk_size=16))
+        self.assertEqual(documents, result)
+
+        with open(test_zip, 'rb') as f:
+            documents = self.tika.iter_all_content(data=f.read())
+            self.assertEqual(
+                next(documents)["Content-Type"], "application/zip")
+            documents.close()
+
+        # An OutOfMemoryError at the end of output is raised
+        tika = TikaApp(file_jar=TIKA_APP_JAR)
+        script = (
+            "import sys; sys.stdout.write('[{}'); "
+            "sys.stderr.write('java.lang.OutOfMemoryError'); sys.exit(1)")
+        tika._command = lambda *args: [sys.executable, "-c", script]
+
+        with self.assertRaises(TikaAppOutOfMemoryError):
+            list(tika.iter_all_content(path=test_zip))
+
+        with self.assertRaises(TikaAppOutOfMemoryError):
+            list(tika.iter_content(path=test_txt))
+
+    def test_jvm_options(self):
+        result = self.tika.extract_only_content(path=test_txt)
+
+        tika = TikaApp(file_jar=TIKA_APP_JAR, jvm_profile="fast-startup")
+        self.assertIn("-XX:TieredStopAtLevel=1", tika.jvm_options)
+        self.assertEqual(result, tika.extract_only_content(path=test_txt))
+
+        with self.assertRaises(TikaAppError):
+            TikaApp(file_jar=TIKA_APP_JAR, jvm_profile="fake").jvm_options
+
+        temp = tempfile.mkdtemp()
+        try:
+            # Without Java >= 13 the archive is not used
+            tika = TikaApp(file_jar=TIKA_APP_JAR, cds_dir=temp)
+            self.assertEqual(result, tika.extract_only_content(path=test_txt))
+            archives = [i for i in os.listdir(temp) if i.endswith(".jsa")]
+            self.assertEqual(
+                bool(archives),
+                any(i.startswith("-XX:SharedArchiveFile")
+                    for i in tika.jvm_options))
+        finally:
+            shutil.rmtree(temp)
+
+    @unittest.skipIf(os.name != "posix", "shell script as java")
+    def test_cds_failure(self):
+        temp = tempfile.mkdtemp()
+        path = os.environ["PATH"]
+        java = os.path.join(temp, "java")
+        runs = os.path.join(temp, "runs")
+
+        # A java without -XX:ArchiveClassesAtExit
+        with open(java, "w") as f:
+            f.write("#!/bin/sh\necho run >> {}\nexit 1\n".format(runs))
+        os.chmod(java, 0o755)
+
+        try:
+            os.environ["PATH"] = temp + os.pathsep + path
+            cds_dir = os.path.join(temp, "cds")
+
+            for _ in range(3):
+                options = TikaApp(
+                    file_jar=TIKA_APP_JAR, cds_dir=cds_dir).jvm_options
+                self.assertFalse(any(
+                    i.startswith("-XX:SharedArchiveFile") for i in options))
+
+            # The training JVM is started only once
+            with open(runs) as f:
+                self.assertEqual(len(f.readlines()), 1)
+            self.assertEqual(
+                [os.path.splitext(i)[1] for i in os.listdir(cds_dir)],
+                [".failed"])
+
+        finally:
+            os.environ["PATH"] = path
+            shutil.rmtree(temp)
+
+    def test_spares(self):
+        with open(test_txt, 'rb') as f:
+            raw = f.read()
+
+        result = self.tika.extract_only_content(path=test_txt)
+
+        with TikaApp(file_jar=TIKA_APP_JAR, spares=1) as tika:
+            for _ in range(3):
+                self.assertEqual(result, tika.extract_only_content(data=raw))
+
+            with open(test_txt) as f:
+                self.assertEqual(
+                    result, tika.extract_only_content(objectInput=f))
+
+    def test_daemon(self):
+        temp = tempfile.mkdtemp()
+        address = os.path.join(temp, "tikapp.sock")
+
+        with self.assertRaises(TikaAppDaemonError):
+            daemon.request(
+                "extract_only_content", path=test_txt, address=address)
+
+        server = daemon.create_server(
+            file_jar=TIKA_APP_JAR, workers=1, address=address)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        try:
+            result = daemon.request(
+                "extract_only_content", path=test_txt, address=address)
+            self.assertEqual(
+                result, self.tika.extract_only_content(path=test_txt))
+
+            with open(test_txt, 'rb') as f:
+                result = daemon.request(
+                    "detect_language", data=f.read(), address=address)
+            self.assertEqual(result, "en")
+
+            with self.assertRaises(TikaAppError):
+                daemon.request(
+                    "extract_only_content", path="/nope", address=address)
+
+            with self.assertRaises(TikaAppDaemonError):
+                daemon.request(
+                    "extract_only_content", path=test_txt,
+                    file_jar=test_txt, address=address)
+        finally:
+            server.shutdown()
+            daemon.close_server(server)
+            shutil.rmtree(temp)
+
 
 if __name__ == '__main__':
     logging.getLogger().addHandler(logging.NullHandler())
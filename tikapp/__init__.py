@@ -18,4 +18,31 @@ limitations under the License.
 """
 
 
-from .tikapp import TikaApp
+import sys
+
+
+if sys.version_info >= (3, 7):
+    # Lazy imports: the command-line client of daemon doesn't pay the
+    # import of TikaApp and asyncio
+    __all__ = ["TikaApp", "AsyncTikaApp"]
+
+    def __getattr__(name):
+        if name == "TikaApp":
+            from .tikapp import TikaApp
+            return TikaApp
+
+        if name == "AsyncTikaApp":
+            from .aio import AsyncTikaApp
+            return AsyncTikaApp
+
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(__name__, name))
+
+else:  # pragma: no cover
+    from .tikapp import TikaApp
+
+    try:
+        from .aio import AsyncTikaApp
+    except SyntaxError:
+        # Python 2 doesn't support asyncio
+        pass
@@ -18,12 +18,14 @@ limitations under the License.
 """
 
 import argparse
+import json
 import logging
 import os
 import runpy
 import sys
 
-from tikapp import TikaApp
+from tikapp import daemon
+from tikapp.exceptions import TikaAppDaemonError
 
 current = os.path.realpath(os.path.dirname(__file__))
 
@@ -53,6 +55,20 @@ def get_args():
         dest="stdin",
         action="store_true",
         help="Enable parsing from stdin")
+    parsing_group.add_argument(
+        "-b",
+        "--batch",
+        dest="batch",
+        nargs="+",
+        metavar="INPUT",
+        help="Files, directories (recursive) and glob patterns to submit. "
+             "Write a NDJSON record for every file")
+    parsing_group.add_argument(
+        "--daemon",
+        dest="daemon",
+        action="store_true",
+        help="Run a daemon with warm Apache Tika workers, used by "
+             "the next invocations")
 
     parser.add_argument(
         "-j",
@@ -95,47 +111,184 @@ def get_args():
         action="store_true",
         help="Output metadata and content from all embedded files")
 
+    parser.add_argument(
+        "--socket",
+        dest="socket",
+        default=daemon.socket_path(),
+        help="Unix domain socket of daemon")
+
+    parser.add_argument(
+        "--workers",
+        dest="workers",
+        type=int,
+        default=2,
+        help="Number of parallel workers of batch and of daemon")
+
+    parser.add_argument(
+        "--resume-from",
+        dest="resume_from",
+        metavar="NDJSON",
+        help="Skip the files of batch already in this output")
+
+    parser.add_argument(
+        "--manifest",
+        dest="manifest",
+        metavar="DIRECTORY",
+        help="Analyze only the files of batch new or changed since the "
+             "last run, recorded in the manifest in this directory")
+
+    parser.add_argument(
+        "--no-daemon",
+        dest="no_daemon",
+        action="store_true",
+        help="Don't submit to daemon, run Apache Tika directly")
+
     parser.add_argument(
         '-v',
         '--version',
         action='version',
         version='%(prog)s {}'.format(__version__))
 
-    args = parser.parse_args()
+    return parser.parse_args()
+
+
+def requests(args):
+    """
+    Return the TikaApp methods, with their arguments, required by the
+    command line, in output order.
+    """
+    methods = []
+
+    if args.detect:
+        methods.append(("detect_content_type", {}))
+
+    if args.text:
+        methods.append(("extract_only_content", {}))
+
+    if args.language:
+        methods.append(("detect_language", {}))
 
-    if args.stdin and args.detect:
-        parser.error("Detection content type with file object is not stable.")
+    if args.all:
+        methods.append(("extract_all_content", {"pretty_print": True}))
 
-    return args
+    if args.metadata:
+        methods.append(("extract_only_metadata", {"pretty_print": True}))
+
+    return methods
+
+
+def batch_record(result, status=None):
+    """Return the NDJSON record of a batch result. """
+    record = {
+        "path": result.input,
+        "content_type": None,
+        "text": None,
+        "metadata": None,
+        "error": None,
+        "elapsed": round(result.elapsed, 3)}
+
+    if status:
+        record["status"] = status
+
+    if result.error is not None:
+        record["error"] = "{}: {}".format(
+            type(result.error).__name__, result.error)
+    elif result.result is not None:
+        record["content_type"] = result.result.content_type
+        record["text"] = result.result.content
+        record["metadata"] = result.result.metadata
+
+    return json.dumps(record, sort_keys=True)
+
+
+def batch(args, file_jar):
+    """
+    Analyze the inputs of batch with parallel JVMs (one for every file)
+    and write a NDJSON record for every file, as soon as it's ready.
+    """
+    from tikapp.batch import expand_inputs, read_processed
+    from tikapp.tikapp import TikaApp
+
+    paths = expand_inputs(args.batch)
+
+    if args.resume_from:
+        processed = read_processed(args.resume_from)
+        paths = (i for i in paths if os.path.normpath(i) not in processed)
+
+    # analyze needs -J, that the pool doesn't support: no warm workers
+    with TikaApp(file_jar) as tika:
+        results = tika.imap_unordered(
+            paths, method="analyze", workers=args.workers)
+
+        for result in results:
+            sys.stdout.write(batch_record(result) + "\n")
+            sys.stdout.flush()
+
+
+def corpus(args, file_jar):
+    """
+    Analyze only the new and changed files of batch, and record them in
+    the manifest.
+    """
+    from tikapp.corpus import CorpusRunner
+    from tikapp.tikapp import TikaApp
+
+    with TikaApp(file_jar) as tika, CorpusRunner(
+            tika, args.manifest, method="analyze",
+            workers=args.workers) as runner:
+
+        for result in runner.run(args.batch):
+            sys.stdout.write(batch_record(result, result.status) + "\n")
+            sys.stdout.flush()
 
 
 def main():
     args = get_args()
+    file_jar = args.jar or os.environ.get("TIKA_APP_JAR", None)
 
-    tika = TikaApp(args.jar or os.environ.get("TIKA_APP_JAR", None))
-
-    parameters = {
-        "path": args.file,
-        "payload": args.payload,
-        "objectInput": sys.stdin if args.stdin else None}
+    if args.daemon:
+        daemon.serve(file_jar=file_jar, workers=args.workers,
+                     address=args.socket)
+        return
 
-    try:
-        if args.detect:
-            print(tika.detect_content_type(**parameters))
+    if args.batch:
+        try:
+            if args.manifest:
+                corpus(args, file_jar)
+            else:
+                batch(args, file_jar)
+        except IOError:
+            pass
+        return
 
-        if args.text:
-            print(tika.extract_only_content(**parameters))
+    parameters = {"path": args.file, "payload": args.payload, "data": None}
 
-        if args.language:
-            print(tika.detect_language(**parameters))
+    if args.stdin:
+        # Read stdin only once: every output needs it
+        parameters["data"] = getattr(sys.stdin, "buffer", sys.stdin).read()
 
-        if args.all:
-            parameters["pretty_print"] = True
-            print(tika.extract_all_content(**parameters))
+    methods = requests(args)
+    tika = None
 
-        if args.metadata:
-            parameters["pretty_print"] = True
-            print(tika.extract_only_metadata(**parameters))
+    try:
+        for method, kwargs in methods:
+            kwargs.update(parameters)
+
+            if tika is None and not args.no_daemon:
+                try:
+                    print(daemon.request(
+                        method, file_jar=file_jar, address=args.socket,
+                        **kwargs))
+                    continue
+                except TikaAppDaemonError:
+                    pass
+
+            if tika is None:
+                # Daemon not available: Apache Tika runs directly
+                from tikapp.tikapp import TikaApp
+                tika = TikaApp(file_jar)
+
+            print(getattr(tika, method)(**kwargs))
 
     except IOError:
         pass
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from __future__ import unicode_literals
+
+import bisect
+import collections
+import contextlib
+import logging
+import re
+import threading
+import time
+
+import six
+
+from .exceptions import TikaAppError, TikaAppTimeoutError
+
+
+log = logging.getLogger(__name__)
+
+
+# Memory of a JVM out of heap: metaspace, code cache, threads, GC
+JVM_OVERHEAD = "256m"
+DEFAULT_HEAP = "1g"
+
+SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3,
+              "t": 1024 ** 4}
+
+_default_scheduler = None
+
+
+def parse_size(size):
+    """
+    Convert a size in JVM syntax (i.e. 512m, 2g) in bytes.
+
+    Args:
+        size (string/int): size, an int is in bytes
+
+    Returns:
+        Size in bytes (int)
+    """
+    if isinstance(size, six.integer_types):
+        return size
+
+    match = re.match(r"^\s*(\d+)\s*([kmgt]?)b?\s*$", str(size), re.I)
+    if not match:
+        msg = "Size {!r} not valid".format(size)
+        log.exception(msg)
+        raise TikaAppError(msg)
+
+    return int(match.group(1)) * SIZE_UNITS[match.group(2).lower()]
+
+
+class MemoryScheduler(object):
+    """
+    Admission control of JVMs against a memory budget of host. Every JVM
+    is charged its heap (-Xmx) plus the overhead of JVM, and waits until
+    the budget has room. The JVMs are admitted in arrival order, so a big
+    heap is never overtaken forever by small ones. A JVM bigger than
+    budget runs alone.
+    The heap can be chosen by size of input, so that small files get
+    small heaps and more JVMs run together.
+    """
+
+    def __init__(
+        self,
+        budget,
+        overhead=JVM_OVERHEAD,
+        default_heap=DEFAULT_HEAP,
+        buckets=None,
+    ):
+        """
+        Args:
+            budget (string/int): memory for all JVMs (i.e. 24g)
+            overhead (string/int): memory of a JVM out of heap
+            default_heap (string): heap of JVMs when neither the buckets
+                                   nor memory_allocation give it
+            buckets (list): list of tuples (max input size, heap), i.e.
+                            [("1m", "256m"), ("50m", "1g")]. Bigger inputs
+                            get the heap of TikaApp or default_heap
+        """
+        self.budget = parse_size(budget)
+        self.overhead = parse_size(overhead)
+        self.default_heap = default_heap
+        self.buckets = sorted(
+            (parse_size(size), heap) for size, heap in (buckets or []))
+        self.running = 0
+        self.waiting = 0
+        self.used = 0
+        self.peak = 0
+        self._cond = threading.Condition()
+        self._queue = collections.deque()
+        self._tickets = 0
+
+    def __repr__(self):  # pragma: no cover
+        class_name = type(self).__name__
+        return "{}(budget={!r}, overhead={!r}, buckets={!r})".format(
+            class_name, self.budget, self.overhead, self.buckets)
+
+    @property
+    def stats(self):
+        with self._cond:
+            return {
+                "budget": self.budget,
+                "used": self.used,
+                "peak": self.peak,
+                "running": self.running,
+                "waiting": self.waiting}
+
+    def heap(self, input_size=None, memory_allocation=None):
+        """
+        Return the heap of a JVM for an input.
+
+        Args:
+            input_size (int): size of input in bytes, None if unknown
+            memory_allocation (string): heap given to TikaApp
+
+        Returns:
+            Heap in JVM syntax (string)
+        """
+        if input_size is not None and self.buckets:
+            i = bisect.bisect_left([s for s, _ in self.buckets], input_size)
+            if i < len(self.buckets):
+                return self.buckets[i][1]
+
+        return memory_allocation or self.default_heap
+
+    @contextlib.contextmanager
+    def admit(self, heap, deadline=None):
+        """
+        Wait until there is room in budget for a JVM with given heap, and
+        charge it until the block ends.
+
+        Args:
+            heap (string/int): heap of JVM (-Xmx)
+            deadline (float): time (time.time()) after that the wait
+                              raises TikaAppTimeoutError
+        """
+        charge = parse_size(heap) + self.overhead
+
+        with self._cond:
+            ticket = self._tickets
+            self._tickets += 1
+            self._queue.append(ticket)
+            self.waiting += 1
+
+            try:
+                while self._queue[0] != ticket or (
+                        self.running and self.used + charge > self.budget):
+                    if deadline is None:
+                        self._cond.wait()
+                        continue
+
+                    left = deadline - time.time()
+                    if left <= 0:
+                        raise TikaAppTimeoutError(
+                            "Timed out waiting for memory budget")
+                    self._cond.wait(left)
+            finally:
+                self.waiting -= 1
+                self._queue.remove(ticket)
+                # The next in queue can fit too
+                self._cond.notify_all()
+
+            self.running += 1
+            self.used += charge
+            self.peak = max(self.peak, self.used)
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.running -= 1
+                self.used -= charge
+                self._cond.notify_all()
+
+
+def set_default_scheduler(scheduler):
+    """
+    Set the scheduler of all TikaApp instances of process without their
+    own scheduler. None disables the admission control.
+
+    Args:
+        scheduler (MemoryScheduler): process-wide scheduler
+    """
+    global _default_scheduler
+    _default_scheduler = scheduler
+
+
+def default_scheduler():
+    """Return the process-wide scheduler, None if not set. """
+    return _default_scheduler
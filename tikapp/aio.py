@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+import asyncio
+import logging
+
+from .signatures import detect as detect_signature
+from .staging import release
+from .tikapp import TikaApp
+from .utils import (
+    binary_stream,
+    file_path,
+    has_fileno,
+    iter_b64decode,
+    iter_buffer,
+    iter_stream,
+    nfc,
+)
+
+try:
+    import simplejson as json
+except ImportError:  # pragma: no cover
+    import json
+
+
+log = logging.getLogger(__name__)
+
+
+class AsyncTikaApp(object):
+    """
+    asyncio client of Tika app (Python >= 3.5). It has the same methods of
+    TikaApp, but they are coroutines. Every call runs Tika app in an
+    asyncio subprocess; at most concurrency JVMs run together.
+    If a call is cancelled its JVM is killed.
+    """
+
+    def __init__(
+        self,
+        file_jar=None,
+        memory_allocation=None,
+        concurrency=4,
+        fast_detection=True,
+    ):
+        """
+        Args:
+            file_jar (string): Path of Tika app Jar
+            memory_allocation (string): max heap size of JVM (-Xmx)
+            concurrency (int): max number of JVMs running together
+            fast_detection (boolean): If True detect_content_type answers
+                                      from magic bytes, when they are not
+                                      ambiguous, without the JVM
+        """
+        self._tika = TikaApp(
+            file_jar, memory_allocation, fast_detection=fast_detection)
+        self.concurrency = concurrency
+        self._semaphore = None
+
+    def __repr__(self):  # pragma: no cover
+        class_name = type(self).__name__
+        return "{}({!r}, {!r}, concurrency={!r})".format(
+            class_name, self.file_jar, self.memory_allocation,
+            self.concurrency)
+
+    @property
+    def file_jar(self):
+        return self._tika.file_jar
+
+    @property
+    def memory_allocation(self):
+        return self._tika.memory_allocation
+
+    @property
+    def fast_detection(self):
+        return self._tika.fast_detection
+
+    @property
+    def semaphore(self):
+        # Created lazily, inside the event loop that uses it
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def _command_template(
+            self, switches, objectInput=None, path=None, chunks=None):
+        """Template for Tika app commands
+
+        Args:
+            switches (list): list of switches to Tika app Jar
+            objectInput (object): file object/standard input to analyze
+            path (string): path of file to analyze
+            chunks (iterable): chunks of bytes to write on standard input
+
+        Return:
+            Standard output data (str)
+        """
+        command = self._tika._command(switches)
+        if path:
+            command.append(path)
+
+        if objectInput and not has_fileno(objectInput):
+            chunks = iter_stream(binary_stream(objectInput))
+            objectInput = None
+
+        log.debug("Subprocess command: {}".format(", ".join(command)))
+
+        async with self.semaphore:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=objectInput or asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL)
+
+            try:
+                if chunks is None:
+                    stdoutdata, _ = await process.communicate()
+                else:
+                    _, stdoutdata = await asyncio.gather(
+                        self._feed(process, chunks), process.stdout.read())
+                    await process.wait()
+            except asyncio.CancelledError:
+                if process.returncode is None:
+                    process.kill()
+                await process.wait()
+                raise
+
+        return nfc(stdoutdata.decode("utf-8").strip())
+
+    @staticmethod
+    async def _feed(process, chunks):
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            # The JVM exited without reading all input
+            log.debug("Error writing on standard input: {!r}".format(e))
+        finally:
+            process.stdin.close()
+
+    async def _file_path(
+            self, path=None, payload=None, objectInput=None, data=None):
+        """Write payload/file object/data in a temp file out of event loop. """
+        if path:
+            return file_path(path)
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, file_path, None, payload, objectInput, data)
+
+    async def _clean(self, given_path, path):
+        if not given_path and path:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, release, path)
+
+    async def _run(
+            self, switches, path, payload, objectInput, data, stdin=True):
+        """Run Tika app on stdin (objectInput, payload, data) or on a file. """
+        if objectInput and stdin:
+            return await self._command_template(switches, objectInput)
+
+        if payload and stdin:
+            return await self._command_template(
+                switches, chunks=iter_b64decode(payload))
+
+        if data is not None and not path and stdin:
+            return await self._command_template(
+                switches, chunks=iter_buffer(data))
+
+        f = await self._file_path(path, payload, objectInput, data)
+        try:
+            return await self._command_template(switches, path=f)
+        finally:
+            await self._clean(path, f)
+
+    async def generic(self, switches=["--help"]):
+        """Generic method. Default display help"""
+        return await self._command_template(switches)
+
+    async def detect_content_type(
+            self, path=None, payload=None, objectInput=None, data=None):
+        """
+        Return the content type of passed file or payload.
+        If fast_detection is enabled, the magic bytes are checked in pure
+        Python before, and Tika app runs only if they are ambiguous.
+
+        Args:
+            path (string): Path of file to analyze
+            payload (string): Payload base64 to analyze
+            objectInput (object): file object/standard input to analyze
+            data (bytes): bytes, bytearray, memoryview or mmap to analyze
+
+        Returns:
+            content type of file (string)
+        """
+        if self.fast_detection and data is not None and not path:
+            result = detect_signature(data=data)
+            if result:
+                return result
+
+        # File object is written on disk, detection from stdin isn't stable
+        f = await self._file_path(path, payload, objectInput, data)
+
+        try:
+            result = None
+            if self.fast_detection:
+                loop = asyncio.get_event_loop()
+                result = await loop.run_in_executor(
+                    None, detect_signature, f)
+
+            if not result:
+                result = await self._command_template(["-d"], path=f)
+                result = result.lower()
+
+        finally:
+            await self._clean(path, f)
+
+        return result
+
+    async def extract_only_content(
+            self, path=None, payload=None, objectInput=None, data=None):
+        """
+        Return only the text content of passed file.
+        These parameters are in OR. Only one of them can be analyzed.
+
+        Args:
+            path (string): Path of file to analyze
+            payload (string): Payload base64 to analyze
+            objectInput (object): file object/standard input to analyze
+            data (bytes): bytes, bytearray, memoryview or mmap to analyze
+
+        Returns:
+            text of file passed (string)
+        """
+        return await self._run(["-t"], path, payload, objectInput, data)
+
+    async def detect_language(
+            self, path=None, payload=None, objectInput=None, data=None):
+        """
+        This function returns the language of passed file or payload.
+
+        Args:
+            path (string): Path of file to analyze
+            payload (string): Payload base64 to analyze
+            objectInput (object): file object/standard input to analyze
+            data (bytes): bytes, bytearray, memoryview or mmap to analyze
+
+        Returns:
+            language of file (string)
+        """
+        return await self._run(["-l"], path, payload, objectInput, data)
+
+    async def extract_all_content(
+        self,
+        path=None,
+        payload=None,
+        objectInput=None,
+        pretty_print=False,
+        convert_to_obj=False,
+        data=None,
+    ):
+        """
+        This function returns a JSON of all contents and
+        metadata of passed file
+
+        Args:
+            path (string): Path of file to analyze
+            payload (string): Payload base64 to analyze
+            objectInput (object): file object/standard input to analyze
+            pretty_print (boolean): If True adds newlines and whitespace,
+                                    for better readability
+            convert_to_obj (boolean): If True convert JSON in object
+            data (bytes): bytes, bytearray, memoryview or mmap to analyze
+        """
+        switches = ["-J", "-t", "-r"]
+        if not pretty_print:
+            switches.remove("-r")
+        result = await self._run(
+            switches, path, payload, objectInput, data)
+
+        if result and convert_to_obj:
+            result = json.loads(result)
+
+        return result
+
+    async def extract_only_metadata(
+        self,
+        path=None,
+        payload=None,
+        objectInput=None,
+        pretty_print=False,
+        convert_to_obj=False,
+        data=None,
+    ):
+        """
+        This function returns a JSON of metadata of passed file
+
+        Args:
+            path (string): Path of file to analyze
+            payload (string): Payload base64 to analyze
+            objectInput (object): file object/standard input to analyze
+            pretty_print (boolean): If True adds newlines and whitespace,
+                                    for better readability
+            convert_to_obj (boolean): If True convert JSON in object
+            data (bytes): bytes, bytearray, memoryview or mmap to analyze
+        """
+        switches = ["-j", "-r"]
+        if not pretty_print:
+            switches.remove("-r")
+        result = await self._run(
+            switches, path, payload, objectInput, data)
+
+        if result and convert_to_obj:
+            result = json.loads(result)
+
+        return result
@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from __future__ import unicode_literals
+
+import atexit
+import logging
+import os
+import select
+import socket
+import subprocess
+import threading
+import time
+
+import six
+from six.moves import http_client
+from six.moves.urllib.parse import quote, urlsplit
+
+from .exceptions import TikaAppError
+from .utils import binary_stream, iter_stream, replayable, stream_position
+
+try:
+    import simplejson as json
+except ImportError:  # pragma: no cover
+    import json
+
+
+log = logging.getLogger(__name__)
+
+
+class TikaBackend(object):
+    """
+    Interface of TikaApp backends. A backend analyzes an input with the
+    given switches of Tika app and returns the same standard output of
+    Tika app. Without backend TikaApp starts a JVM for every call.
+    """
+
+    def process(self, switches, path=None, objectInput=None, chunks=None):
+        """
+        Args:
+            switches (list): list of switches to Tika app Jar
+            path (string): Path of file to analyze
+            objectInput (object): file object/standard input to analyze
+            chunks (iterable): chunks of bytes to analyze
+
+        Returns:
+            Standard output data of Tika app (bytes)
+        """
+        raise NotImplementedError
+
+    def supports(self, switches):
+        """Return False if the backend can't give the output of switches,
+        then TikaApp starts a JVM. """
+        return True
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def server_endpoint(switches):
+    """
+    Return the Tika server endpoint for the switches of Tika app.
+
+    Returns:
+        tuple: endpoint, accept header, pretty print of JSON
+    """
+    switches = set(switches)
+    pretty_print = "-r" in switches
+
+    if "-J" in switches:
+        return "/rmeta/text", "application/json", pretty_print
+    elif "-j" in switches:
+        return "/meta", "application/json", pretty_print
+    elif "-d" in switches:
+        return "/detect/stream", "text/plain", False
+    elif "-l" in switches:
+        return "/language/stream", "text/plain", False
+    elif "-t" in switches:
+        return "/tika", "text/plain", False
+
+    msg = "Switches {!r} not supported by Tika server".format(
+        sorted(switches))
+    log.exception(msg)
+    raise TikaAppError(msg)
+
+
+class TikaServerBackend(TikaBackend):
+    """
+    Backend that sends the requests to a Tika server, over keep-alive
+    HTTP connections. The server can be started locally from
+    tika-server.jar or it can be an already running one.
+    The request bodies are streamed, without temp files.
+    """
+
+    def __init__(
+        self,
+        url=None,
+        server_jar=None,
+        connections=4,
+        timeout=None,
+        memory_allocation=None,
+        start_timeout=120,
+    ):
+        """
+        Args:
+            url (string): url of running Tika server
+            server_jar (string): path of tika-server.jar to start
+                                 locally, if url is not given
+            connections (int): max idle connections kept alive
+            timeout (float): timeout of connections
+            memory_allocation (string): max heap size of started server
+            start_timeout (float): seconds to wait the started server
+        """
+        if not url and not server_jar:
+            msg = "Give the url or the jar of Tika server"
+            log.exception(msg)
+            raise TikaAppError(msg)
+
+        self.server_jar = server_jar
+        self.connections = connections
+        self.timeout = timeout
+        self.memory_allocation = memory_allocation
+        self._process = None
+        self._idle = []
+        self._lock = threading.Lock()
+
+        if not url:
+            url = self._start_server(start_timeout)
+
+        self.url = url
+        parts = urlsplit(url)
+        self._host = parts.hostname
+        self._port = parts.port or 80
+        self._base = parts.path.rstrip("/")
+
+        if self._process is not None:
+            self._wait_server(start_timeout)
+
+    def __repr__(self):  # pragma: no cover
+        class_name = type(self).__name__
+        return "{}({!r}, server_jar={!r})".format(
+            class_name, self.url, self.server_jar)
+
+    def _start_server(self, start_timeout):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+        s.close()
+
+        command = ["java"]
+        if self.memory_allocation:
+            command.append("-Xmx{}".format(self.memory_allocation))
+        command.extend([
+            "-jar", self.server_jar,
+            "--host", "127.0.0.1",
+            "--port", str(port)])
+
+        log.debug("Start Tika server: {}".format(", ".join(command)))
+
+        with open(os.devnull, "r+b") as devnull:
+            self._process = subprocess.Popen(
+                command, stdin=devnull, stdout=devnull, stderr=devnull)
+
+        atexit.register(self.close)
+        return "http://127.0.0.1:{}".format(port)
+
+    def _wait_server(self, start_timeout):
+        started = time.time()
+
+        while True:
+            if self._process.poll() is not None:
+                raise TikaAppError("Tika server exited")
+
+            try:
+                conn = self._connection()
+                conn.request("GET", self._base + "/tika")
+                conn.getresponse().read()
+                self._release(conn)
+                return
+            except (socket.error, http_client.HTTPException):
+                if time.time() - started > start_timeout:
+                    self.close()
+                    raise TikaAppError("Tika server did not start")
+                time.sleep(0.2)
+
+    def _connection(self):
+        with self._lock:
+            while self._idle:
+                conn = self._idle.pop()
+                if not self._closed(conn):
+                    return conn
+                conn.close()
+
+        return http_client.HTTPConnection(
+            self._host, self._port, timeout=self.timeout)
+
+    @staticmethod
+    def _closed(conn):
+        """An idle connection is readable only if the server closed it. """
+        if conn.sock is None:
+            return True
+        try:
+            return bool(select.select([conn.sock], [], [], 0)[0])
+        except (ValueError, select.error, socket.error):
+            return True
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.connections:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _request(self, conn, endpoint, accept, path, objectInput, chunks):
+        conn.putrequest(
+            "PUT", self._base + endpoint, skip_accept_encoding=True)
+        conn.putheader("Accept", accept)
+
+        if path:
+            # RFC 6266: the file name can have any character
+            name = os.path.basename(path)
+            if isinstance(name, six.text_type):
+                name = name.encode("utf-8")
+
+            conn.putheader("Content-Length", str(os.path.getsize(path)))
+            conn.putheader(
+                "Content-Disposition",
+                "attachment; filename*=UTF-8''{}".format(quote(name)))
+            conn.endheaders()
+
+            with open(path, "rb") as f:
+                for chunk in iter_stream(f):
+                    conn.send(chunk)
+
+        else:
+            if chunks is None:
+                chunks = iter_stream(binary_stream(objectInput))
+
+            conn.putheader("Transfer-Encoding", "chunked")
+            conn.endheaders()
+
+            for chunk in chunks:
+                if len(chunk):
+                    conn.send("{:x}\r\n".format(len(chunk)).encode("ascii"))
+                    conn.send(chunk)
+                    conn.send(b"\r\n")
+            conn.send(b"0\r\n\r\n")
+
+        response = conn.getresponse()
+        return response.status, response.read(), response.will_close
+
+    def process(self, switches, path=None, objectInput=None, chunks=None):
+        endpoint, accept, pretty_print = server_endpoint(switches)
+
+        # An input that can be read again is retried on a new connection
+        position = None
+        if not path and chunks is None:
+            position = stream_position(objectInput)
+        attempts = 2 if replayable(path, objectInput, chunks) else 1
+
+        for attempt in range(attempts):
+            if attempt and position is not None:
+                binary_stream(objectInput).seek(position)
+
+            conn = self._connection()
+            try:
+                status, body, will_close = self._request(
+                    conn, endpoint, accept, path, objectInput, chunks)
+            except (socket.error, http_client.HTTPException) as e:
+                # i.e. an idle connection closed by the server
+                conn.close()
+                if attempt + 1 == attempts:
+                    raise TikaAppError(
+                        "Error from Tika server: {!r}".format(e))
+            except Exception:
+                conn.close()
+                raise
+            else:
+                if will_close:
+                    conn.close()
+                else:
+                    self._release(conn)
+                break
+
+        if status >= 300:
+            # Like Tika app, that writes nothing if parsing fails
+            log.warning("Tika server {} returned {}".format(endpoint, status))
+            return b""
+
+        if pretty_print and body.strip():
+            obj = json.loads(body.decode("utf-8"))
+            body = json.dumps(
+                obj, indent=4, ensure_ascii=False).encode("utf-8")
+
+        return body
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+
+        for conn in idle:
+            conn.close()
+
+        if self._process is not None:
+            if self._process.poll() is None:
+                self._process.kill()
+            self._process.wait()
+            self._process = None
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from __future__ import unicode_literals
+
+import collections
+import glob
+import io
+import logging
+import os
+import shutil
+import tempfile
+
+import six
+
+from .exceptions import TikaAppFilePathError
+
+try:
+    import simplejson as json
+except ImportError:  # pragma: no cover
+    import json
+
+
+log = logging.getLogger(__name__)
+
+
+# mode: (switches, extension of output files of Tika batch)
+BATCH_MODES = {
+    "text": (["-t"], ".txt"),
+    "metadata": (["-j"], ".json"),
+    "all": (["-J", "-t"], ".json"),
+}
+
+
+BatchResult = collections.namedtuple(
+    "BatchResult", ["path", "output_path", "content", "error"])
+
+
+def link_file(source, destination):
+    """Hardlink source in destination, or symlink/copy it if not possible. """
+    for func in (getattr(os, "link", None), getattr(os, "symlink", None)):
+        if func is None:
+            continue
+        try:
+            func(source, destination)
+            return
+        except OSError:
+            pass
+
+    shutil.copyfile(source, destination)
+
+
+def stage_files(paths, directory):
+    """
+    Stage a list of files in a directory, so that Tika batch can process
+    them. Every file goes in its own subdirectory to keep the original
+    file name.
+
+    Args:
+        paths (list): paths of files to analyze
+        directory (string): staging directory
+
+    Returns:
+        Dict with relative path in staging directory as key and
+        original path as value
+    """
+    mapping = collections.OrderedDict()
+
+    for i, path in enumerate(paths):
+        if not os.path.isfile(path):
+            msg = "File {!r} does not exist".format(path)
+            log.exception(msg)
+            raise TikaAppFilePathError(msg)
+
+        relative = os.path.join(str(i), os.path.basename(path))
+        os.mkdir(os.path.join(directory, str(i)))
+        link_file(os.path.abspath(path), os.path.join(directory, relative))
+        mapping[relative] = path
+
+    return mapping
+
+
+def walk_files(directory):
+    """
+    Return all files in directory.
+
+    Returns:
+        Dict with relative path as key and original path as value
+    """
+    mapping = collections.OrderedDict()
+
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            mapping[os.path.relpath(path, directory)] = path
+
+    return mapping
+
+
+def expand_inputs(inputs):
+    """
+    Expand paths, directories (recursive) and glob patterns in the list
+    of files to analyze. The paths that don't exist are kept, so that
+    their errors are reported. Every file is given once.
+
+    Args:
+        inputs (list): paths, directories and glob patterns
+
+    Returns:
+        Generator of paths of files
+    """
+    seen = set()
+
+    for i in inputs:
+        if os.path.isdir(i):
+            paths = list(six.itervalues(walk_files(i)))
+
+        elif glob.has_magic(i):
+            if six.PY2:  # pragma: no cover
+                paths = sorted(glob.glob(i))
+            else:
+                paths = sorted(glob.glob(i, recursive=True))
+
+            paths = [j for p in paths for j in (
+                six.itervalues(walk_files(p)) if os.path.isdir(p) else [p])]
+
+        else:
+            paths = [i]
+
+        for path in paths:
+            # The same file can match many inputs
+            key = os.path.normpath(path)
+            if key not in seen:
+                seen.add(key)
+                yield path
+
+
+def read_processed(path):
+    """
+    Return the paths already in a NDJSON output of command-line batch.
+    A truncated last record, i.e. of an interrupted run, is ignored.
+
+    Args:
+        path (string): NDJSON file
+
+    Returns:
+        Set of paths
+    """
+    processed = set()
+
+    if not os.path.exists(path):
+        return processed
+
+    with io.open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                processed.add(os.path.normpath(json.loads(line)["path"]))
+            except (ValueError, KeyError, TypeError):
+                log.warning("Record not valid in {!r}: {!r}".format(
+                    path, line))
+
+    return processed
+
+
+def read_results(mapping, output_dir, mode):
+    """
+    Read the outputs of Tika batch and map them back to the input files.
+
+    Args:
+        mapping (dict): relative path as key and original path as value
+        output_dir (string): output directory of Tika batch
+        mode (string): text, metadata or all
+
+    Returns:
+        Generator of BatchResult
+    """
+    extension = BATCH_MODES[mode][1]
+
+    for relative, path in mapping.items():
+        output_path = os.path.join(output_dir, relative + extension)
+
+        if not os.path.exists(output_path):
+            yield BatchResult(path, None, None, "No output from Tika batch")
+            continue
+
+        try:
+            with io.open(output_path, encoding="utf-8") as f:
+                content = f.read()
+
+            if extension == ".json":
+                content = json.loads(content) if content.strip() else None
+            else:
+                content = content.strip()
+
+        except (IOError, ValueError) as e:
+            yield BatchResult(path, output_path, None, str(e))
+
+        else:
+            yield BatchResult(path, output_path, content, None)
+
+
+def batch_directories(paths_or_dir, output_dir):
+    """
+    Prepare input and output directories of Tika batch.
+
+    Args:
+        paths_or_dir (string/list): directory or list of files
+        output_dir (string): output directory, None to use a temp one
+
+    Returns:
+        tuple: input directory, output directory, mapping of files,
+        list of temp directories to remove at the end
+    """
+    temps = []
+
+    if output_dir is None:
+        output_dir = tempfile.mkdtemp(prefix="tikapp-out-")
+        temps.append(output_dir)
+
+    if not isinstance(paths_or_dir, six.string_types):
+        input_dir = tempfile.mkdtemp(prefix="tikapp-in-")
+        temps.append(input_dir)
+        try:
+            mapping = stage_files(paths_or_dir, input_dir)
+        except Exception:
+            remove_directories(temps)
+            raise
+
+    elif os.path.isdir(paths_or_dir):
+        input_dir = paths_or_dir
+        mapping = walk_files(input_dir)
+
+    else:
+        remove_directories(temps)
+        msg = "Directory {!r} does not exist".format(paths_or_dir)
+        log.exception(msg)
+        raise TikaAppFilePathError(msg)
+
+    return input_dir, output_dir, mapping, temps
+
+
+def remove_directories(directories):
+    for d in directories:
+        shutil.rmtree(d, ignore_errors=True)
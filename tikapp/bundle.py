@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from __future__ import unicode_literals
+
+import base64
+import logging
+import os
+import tempfile
+import zipfile
+
+import six
+
+from .staging import tmpfs_dir
+
+log = logging.getLogger(__name__)
+
+
+# Default budget of a bundle of payloads analyzed with one JVM
+BUNDLE_MAX_BYTES = 16 * 1024 * 1024
+BUNDLE_MAX_COUNT = 256
+
+EMBEDDED_PATH_KEY = "X-TIKA:embedded_resource_path"
+
+
+def payload_bytes(payload):
+    """Return the raw bytes of a base64 payload or of a buffer. """
+    if isinstance(payload, six.string_types):
+        return base64.b64decode(payload)
+    if isinstance(payload, bytes):
+        return payload
+    return bytes(memoryview(payload))
+
+
+def iter_bundles(payloads, max_bytes=BUNDLE_MAX_BYTES,
+                 max_count=BUNDLE_MAX_COUNT):
+    """
+    Group the payloads in bundles within a budget of bytes and count.
+    A payload bigger than max_bytes is in a bundle by itself.
+
+    Args:
+        payloads (iterable): base64 payloads or buffers
+        max_bytes (int): max total size of a bundle
+        max_count (int): max number of payloads in a bundle
+
+    Returns:
+        Generator of lists of raw payloads (bytes)
+    """
+    bundle = []
+    size = 0
+
+    for payload in payloads:
+        raw = payload_bytes(payload)
+
+        if bundle and (size + len(raw) > max_bytes or
+                       len(bundle) >= max_count):
+            yield bundle
+            bundle = []
+            size = 0
+
+        bundle.append(raw)
+        size += len(raw)
+
+    if bundle:
+        yield bundle
+
+
+def entry_name(index):
+    return "{:05d}".format(index)
+
+
+def write_bundle(bundle):
+    """
+    Write the payloads of a bundle in a zip (stored, not compressed) on
+    tmpfs. Every entry is named by the position of its payload.
+
+    Args:
+        bundle (list): raw payloads
+
+    Returns:
+        Path of zip
+    """
+    fd, path = tempfile.mkstemp(suffix=".zip", dir=tmpfs_dir())
+    log.debug("Write bundle of {} payloads in {!r}".format(len(bundle), path))
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            with zipfile.ZipFile(f, "w", zipfile.ZIP_STORED) as z:
+                for i, raw in enumerate(bundle):
+                    z.writestr(entry_name(i), raw)
+    except Exception:
+        os.remove(path)
+        raise
+
+    return path
+
+
+def split_documents(documents, count):
+    """
+    Map the documents of Tika app (-J) for a bundle back to its payloads,
+    by entry name. The document of the zip itself is dropped, and the
+    embedded resource paths are made relative to the payload, as if it
+    was analyzed alone. Tika app lists the embedded documents in
+    post-order, so the document of every payload is moved before its
+    embedded documents.
+
+    Args:
+        documents (list): documents of Tika app for the zip
+        count (int): number of payloads in bundle
+
+    Returns:
+        List (one item for every payload) of lists of documents
+    """
+    results = [[] for _ in range(count)]
+    names = {entry_name(i): i for i in range(count)}
+
+    for document in documents or []:
+        embedded_path = document.get(EMBEDDED_PATH_KEY)
+        if not embedded_path:
+            continue
+
+        name, _, rest = embedded_path.lstrip("/").partition("/")
+        index = names.get(name)
+        if index is None:
+            log.warning("Embedded resource {!r} not in bundle".format(
+                embedded_path))
+            continue
+
+        document = dict(document)
+        if rest:
+            document[EMBEDDED_PATH_KEY] = "/" + rest
+            results[index].append(document)
+        else:
+            del document[EMBEDDED_PATH_KEY]
+            results[index].insert(0, document)
+
+    return results
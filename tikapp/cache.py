@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from __future__ import unicode_literals
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import six
+
+
+log = logging.getLogger(__name__)
+
+
+class TikaCache(object):
+    """
+    Persistent cache of Tika app outputs in a SQLite database.
+    The key is made of the SHA-256 of the input, the switches and the
+    fingerprint of Tika app Jar. The least recently used entries are
+    evicted when the cache exceeds max_bytes or max_entries.
+    """
+
+    # Max entries read at once by eviction
+    EVICT_BATCH = 64
+
+    def __init__(self, path, max_bytes=None, max_entries=None):
+        """
+        Args:
+            path (string): path of SQLite database
+            max_bytes (int): max total size of cached outputs
+            max_entries (int): max number of cached outputs
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "size INTEGER NOT NULL, accessed REAL NOT NULL)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed "
+            "ON entries (accessed)")
+
+        # Running total of sizes, kept by triggers, so that the eviction
+        # doesn't scan all entries
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS totals ("
+            "id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL)")
+        self._conn.execute(
+            "INSERT OR IGNORE INTO totals (id, size) "
+            "SELECT 0, COALESCE(SUM(size), 0) FROM entries")
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT "
+            "ON entries BEGIN UPDATE totals SET size = size + NEW.size; END")
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE "
+            "ON entries BEGIN UPDATE totals SET size = size - OLD.size; END")
+        self._conn.commit()
+
+    def __repr__(self):  # pragma: no cover
+        class_name = type(self).__name__
+        return "{}({!r}, max_bytes={!r}, max_entries={!r})".format(
+            class_name, self.path, self.max_bytes, self.max_entries)
+
+    @staticmethod
+    def key(jar_fingerprint, switches, digest):
+        """
+        Args:
+            jar_fingerprint (string): fingerprint of Tika app Jar
+            switches (list): list of switches to Tika app Jar
+            digest (string): SHA-256 of input
+
+        Returns:
+            Key of cache (string)
+        """
+        h = hashlib.sha256()
+        for i in [jar_fingerprint, "\0".join(switches), digest]:
+            h.update(i.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    @property
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) "
+                "FROM entries").fetchone()
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size}
+
+    def get(self, key):
+        """Return the cached output (unicode) or None. """
+        value = self.get_raw(key)
+        return value.decode("utf-8") if value is not None else None
+
+    def get_raw(self, key):
+        """Return the cached output (bytes) or None. """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM entries WHERE key = ?",
+                (key,)).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?",
+                (time.time(), key))
+            self._conn.commit()
+
+        return six.binary_type(row[0])
+
+    def set(self, key, value):
+        """Store the output (unicode or bytes) and evict the old entries. """
+        if isinstance(value, six.text_type):
+            value = value.encode("utf-8")
+
+        with self._lock:
+            # Not INSERT OR REPLACE, that doesn't fire the delete trigger
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.execute(
+                "INSERT INTO entries (key, value, size, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), len(value), time.time()))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if self.max_entries:
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries "
+                "ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+
+        if not self.max_bytes:
+            return
+
+        total = self._conn.execute("SELECT size FROM totals").fetchone()[0]
+
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed LIMIT ?",
+                (self.EVICT_BATCH,)).fetchall()
+
+            expired = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                expired.append((key,))
+                total -= size
+
+            self._conn.executemany(
+                "DELETE FROM entries WHERE key = ?", expired)
+
+            if len(rows) < self.EVICT_BATCH:
+                break
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+            self.hits = self.misses = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
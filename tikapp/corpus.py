@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from __future__ import unicode_literals
+
+import collections
+import io
+import logging
+import os
+import tempfile
+import threading
+
+from .batch import expand_inputs
+from .utils import file_sha256, jar_sha256
+
+try:
+    import simplejson as json
+except ImportError:  # pragma: no cover
+    import json
+
+
+log = logging.getLogger(__name__)
+
+
+# Switches of Tika app used by every method of TikaApp
+METHOD_SWITCHES = {
+    "detect_content_type": ("-d",),
+    "extract_only_content": ("-t",),
+    "detect_language": ("-l",),
+    "extract_all_content": ("-J", "-t"),
+    "extract_only_metadata": ("-j",),
+    "analyze": ("-J", "-t"),
+}
+
+
+ManifestEntry = collections.namedtuple(
+    "ManifestEntry", ["size", "mtime", "sha256", "jar", "switches"])
+
+
+CorpusResult = collections.namedtuple(
+    "CorpusResult", ["input", "status", "result", "error", "elapsed"])
+
+
+class CorpusManifest(object):
+    """
+    Manifest of the files of a corpus already analyzed: path, size, mtime,
+    SHA-256, SHA-256 of Tika app Jar and switches. It's kept in a
+    directory as a snapshot (manifest.ndjson) and an append-only journal
+    (journal.ndjson) of the changes after it. The journal is replayed at
+    load, so an interrupted run loses nothing, and merged in the
+    snapshot by compact.
+    """
+
+    MANIFEST = "manifest.ndjson"
+    JOURNAL = "journal.ndjson"
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory (string): directory of manifest and journal
+        """
+        self.directory = directory
+        self.entries = {}
+        self._interned = {}
+        self._lock = threading.Lock()
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self._manifest_path = os.path.join(directory, self.MANIFEST)
+        self._journal_path = os.path.join(directory, self.JOURNAL)
+
+        self._load(self._manifest_path)
+        self._load(self._journal_path)
+        self._journal = open(self._journal_path, "ab")
+
+    def __repr__(self):  # pragma: no cover
+        class_name = type(self).__name__
+        return "{}({!r})".format(class_name, self.directory)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, path):
+        return path in self.entries
+
+    def get(self, path):
+        """Return the ManifestEntry of path or None. """
+        return self.entries.get(path)
+
+    def _intern(self, value):
+        # Jar hashes and switches are the same for many entries
+        return self._interned.setdefault(value, value)
+
+    def _apply(self, record):
+        path = record["path"]
+
+        if record.get("removed"):
+            self.entries.pop(path, None)
+            return
+
+        self.entries[path] = ManifestEntry(
+            record["size"],
+            record["mtime"],
+            record["sha256"],
+            self._intern(record["jar"]),
+            self._intern(tuple(record["switches"])))
+
+    def _load(self, path):
+        if not os.path.exists(path):
+            return
+
+        with io.open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError, TypeError):
+                    # i.e. the last record of an interrupted run
+                    log.warning("Record not valid in {!r}: {!r}".format(
+                        path, line))
+
+    @staticmethod
+    def _record(path, entry=None):
+        if entry is None:
+            return {"path": path, "removed": True}
+
+        record = entry._asdict()
+        record["path"] = path
+        record["switches"] = list(entry.switches)
+        return record
+
+    def _append(self, record):
+        line = json.dumps(record, sort_keys=True) + "\n"
+
+        with self._lock:
+            self._apply(record)
+            self._journal.write(line.encode("utf-8"))
+            self._journal.flush()
+
+    def set(self, path, entry):
+        """Record in journal the ManifestEntry of path. """
+        self._append(self._record(path, entry))
+
+    def remove(self, path):
+        """Record in journal that path was removed. """
+        self._append(self._record(path))
+
+    def compact(self):
+        """
+        Write a new snapshot with all entries and empty the journal.
+        The snapshot is replaced atomically: after a crash, the old
+        snapshot and the journal give the same entries.
+        """
+        with self._lock:
+            fd, temp = tempfile.mkstemp(
+                prefix=".manifest-", dir=self.directory)
+
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for path in sorted(self.entries):
+                        line = json.dumps(self._record(
+                            path, self.entries[path]), sort_keys=True)
+                        f.write((line + "\n").encode("utf-8"))
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                getattr(os, "replace", os.rename)(temp, self._manifest_path)
+
+            except Exception:
+                os.remove(temp)
+                raise
+
+            self._journal.close()
+            self._journal = open(self._journal_path, "wb")
+
+    def close(self):
+        with self._lock:
+            self._journal.close()
+
+
+class CorpusRunner(object):
+    """
+    Incremental analysis of a corpus with TikaApp: only the new and
+    changed files, and the ones analyzed with another Tika app Jar or
+    other switches, are analyzed again. A file is changed if its size
+    or mtime changed and then its SHA-256 too. Every analyzed file is
+    recorded in the journal of manifest after its result is consumed,
+    so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(
+        self,
+        tika,
+        directory,
+        method="extract_only_content",
+        workers=4,
+        **kwargs
+    ):
+        """
+        Args:
+            tika (TikaApp): TikaApp used to analyze the files
+            directory (string): directory of manifest and journal
+            method (string): method of TikaApp to call for every file
+            workers (int): number of calls running together
+            kwargs: other arguments of method (i.e. convert_to_obj)
+        """
+        self.tika = tika
+        self.method = method
+        self.workers = workers
+        self.kwargs = kwargs
+        self.manifest = CorpusManifest(directory)
+        self.counters = collections.Counter()
+
+        switches = METHOD_SWITCHES.get(method, (method,))
+        if kwargs.get("pretty_print"):
+            switches += ("-r",)
+        self.switches = switches
+
+    def __repr__(self):  # pragma: no cover
+        class_name = type(self).__name__
+        return "{}({!r}, {!r})".format(
+            class_name, self.manifest.directory, self.method)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.manifest.close()
+
+    @property
+    def stats(self):
+        stats = dict.fromkeys(
+            ("unchanged", "new", "changed", "stale", "removed", "failed"), 0)
+        stats.update(self.counters)
+        stats["entries"] = len(self.manifest)
+        return stats
+
+    def _check(self, path, jar):
+        """
+        Compare a file with its entry of manifest.
+
+        Returns:
+            tuple: new ManifestEntry (None if the file can't be read) and
+            status: None (unchanged), "new", "changed" or "stale" (same
+            content, other Jar or switches)
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            # TikaApp reports the error
+            return None, "new"
+
+        old = self.manifest.get(path)
+        current = old is not None and (
+            old.jar == jar and old.switches == self.switches)
+
+        if current and (old.size, old.mtime) == (st.st_size, st.st_mtime):
+            return old, None
+
+        entry = ManifestEntry(
+            st.st_size, st.st_mtime, file_sha256(path), jar, self.switches)
+
+        if old is None:
+            return entry, "new"
+
+        if old.sha256 != entry.sha256:
+            return entry, "changed"
+
+        if current:
+            # Only touched: record the new mtime, without analysis
+            self.manifest.set(path, entry)
+            return entry, None
+
+        return entry, "stale"
+
+    def run(self, inputs, remove_missing=True):
+        """
+        Analyze the new and changed files of inputs.
+
+        Args:
+            inputs (list): paths, directories (recursive) and glob patterns
+            remove_missing (boolean): If True, at the end, the entries of
+                                      files not in inputs are removed from
+                                      manifest (and yielded as "removed")
+                                      and the manifest is compacted
+
+        Returns:
+            Generator of CorpusResult (input, status, result, error,
+            elapsed), status is "new", "changed", "stale" or "removed"
+        """
+        jar = jar_sha256(self.tika.file_jar)
+        seen = set()
+        pending = {}
+
+        def todo():
+            for i in expand_inputs(inputs):
+                path = os.path.abspath(i)
+                if path in seen:
+                    continue
+                seen.add(path)
+
+                entry, status = self._check(path, jar)
+                if status is None:
+                    self.counters["unchanged"] += 1
+                    continue
+
+                pending[path] = entry, status
+                yield path
+
+        results = self.tika.imap_unordered(
+            todo(), method=self.method, workers=self.workers, **self.kwargs)
+
+        for r in results:
+            entry, status = pending.pop(r.input)
+            yield CorpusResult(r.input, status, r.result, r.error, r.elapsed)
+
+            if r.error is not None or entry is None:
+                self.counters["failed"] += 1
+            else:
+                self.counters[status] += 1
+                self.manifest.set(r.input, entry)
+
+        if not remove_missing:
+            return
+
+        for path in sorted(set(self.manifest.entries) - seen):
+            yield CorpusResult(path, "removed", None, None, 0)
+            self.counters["removed"] += 1
+            self.manifest.remove(path)
+
+        self.manifest.compact()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+# The client side of this module runs at every command-line invocation:
+# it must import only what is needed to talk with the daemon. TikaApp is
+# imported only in the daemon process.
+
+import json
+import logging
+import os
+import socket
+
+from .exceptions import TikaAppError, TikaAppDaemonError
+
+
+log = logging.getLogger(__name__)
+
+
+# Methods of TikaApp the daemon accepts
+METHODS = (
+    "detect_content_type",
+    "extract_only_content",
+    "detect_language",
+    "extract_all_content",
+    "extract_only_metadata")
+
+
+def socket_path():
+    """
+    Return the default path of the Unix domain socket of the daemon.
+    It can be changed with TIKAPP_SOCKET environment variable.
+
+    Returns:
+        Path of Unix domain socket
+    """
+    path = os.environ.get("TIKAPP_SOCKET")
+
+    if not path:
+        tempdir = os.environ.get("TMPDIR", "/tmp")
+        path = os.path.join(tempdir, "tikapp-{}.sock".format(os.getuid()))
+
+    return path
+
+
+def request(method, path=None, payload=None, data=None, file_jar=None,
+            address=None, timeout=None, **kwargs):
+    """
+    Submit a request to a running daemon. TikaAppDaemonError is raised
+    if the daemon isn't running or refused the request, TikaAppError if
+    it failed to analyze the input.
+
+    Args:
+        method (string): name of TikaApp method
+        path (string): path of file to analyze
+        payload (string): base64 to analyze
+        data (bytes): raw bytes to analyze
+        file_jar (string): Apache Tika app JAR the caller wants. If the
+                           daemon runs another JAR, the request is
+                           refused
+        address (string): Unix domain socket of daemon
+        timeout (int): socket timeout in seconds
+        kwargs: other arguments of TikaApp method
+
+    Returns:
+        The result of TikaApp method
+    """
+    if path:
+        # The daemon has another working directory
+        kwargs["path"] = os.path.abspath(path)
+
+    if payload:
+        kwargs["payload"] = payload
+
+    header = {
+        "method": method,
+        "kwargs": kwargs,
+        "jar": os.path.realpath(file_jar) if file_jar else None,
+        "length": len(data) if data is not None else -1}
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+
+    try:
+        try:
+            sock.connect(address or socket_path())
+        except socket.error as e:
+            raise TikaAppDaemonError(str(e))
+
+        sock.sendall(json.dumps(header).encode("utf-8") + b"\n")
+        if data:
+            sock.sendall(data)
+        sock.shutdown(socket.SHUT_WR)
+
+        response = []
+        while True:
+            buf = sock.recv(65536)
+            if not buf:
+                break
+            response.append(buf)
+    finally:
+        sock.close()
+
+    if not response:
+        raise TikaAppDaemonError("Empty response from daemon")
+
+    response = json.loads(b"".join(response).decode("utf-8"))
+
+    if response.get("unavailable"):
+        raise TikaAppDaemonError(response["error"])
+
+    if response.get("error"):
+        raise TikaAppError(response["error"])
+
+    return response["result"]
+
+
+def _read_request(line, rfile):
+    header = json.loads(line.decode("utf-8"))
+    kwargs = header.get("kwargs") or {}
+
+    length = header.get("length", -1)
+    if length >= 0:
+        kwargs["data"] = rfile.read(length)
+
+    return header, kwargs
+
+
+def _handle(tika, rfile, wfile):
+    line = rfile.readline()
+    if not line:
+        # Liveness probe of another daemon
+        return
+
+    try:
+        header, kwargs = _read_request(line, rfile)
+    except ValueError:
+        response = {"error": "Malformed request"}
+    else:
+        method = header.get("method")
+        jar = header.get("jar")
+
+        if method not in METHODS:
+            response = {"error": "Unknown method {!r}".format(method)}
+
+        elif jar and jar != os.path.realpath(tika.file_jar):
+            response = {
+                "error": "Daemon runs {!r}".format(tika.file_jar),
+                "unavailable": True}
+
+        else:
+            try:
+                response = {"result": getattr(tika, method)(**kwargs)}
+            except Exception as e:
+                log.exception("Daemon failed to run {!r}".format(method))
+                response = {"error": "{}: {}".format(type(e).__name__, e)}
+
+    wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+def _alive(address):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(address)
+    except socket.error:
+        return False
+    else:
+        return True
+    finally:
+        sock.close()
+
+
+def create_server(file_jar=None, memory_allocation=None, workers=2,
+                  address=None):
+    """
+    Start the warm Apache Tika workers and bind the Unix domain socket
+    of the daemon.
+
+    Args:
+        file_jar (string): Apache Tika app JAR
+        memory_allocation (string): memory for every worker
+        workers (int): number of warm workers
+        address (string): Unix domain socket of daemon
+
+    Returns:
+        socketserver server. Its attribute tika is the TikaApp instance
+        that serves the requests
+    """
+    try:
+        import socketserver
+    except ImportError:  # pragma: no cover
+        import SocketServer as socketserver
+
+    from .tikapp import TikaApp
+
+    address = address or socket_path()
+
+    if os.path.exists(address):
+        if _alive(address):
+            msg = "Daemon already running on {!r}".format(address)
+            log.error(msg)
+            raise TikaAppError(msg)
+        os.remove(address)
+
+    tika = TikaApp(
+        file_jar=file_jar,
+        memory_allocation=memory_allocation,
+        pool_size=workers,
+        fast_detection=True)
+
+    # Text extraction is the most common request: its workers are started
+    # before the first client
+    tika.pool.warm(["-t"], workers)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            _handle(tika, self.rfile, self.wfile)
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    umask = os.umask(0o077)
+    try:
+        server = Server(address, Handler)
+    except Exception:
+        tika.close()
+        raise
+    finally:
+        os.umask(umask)
+
+    server.tika = tika
+    return server
+
+
+def close_server(server):
+    """Stop the workers of daemon and remove its Unix domain socket. """
+    server.server_close()
+    server.tika.close()
+
+    if os.path.exists(server.server_address):
+        os.remove(server.server_address)
+
+
+def serve(file_jar=None, memory_allocation=None, workers=2, address=None):
+    """
+    Run in foreground a daemon that keeps warm Apache Tika workers and
+    serves the command-line clients over a Unix domain socket.
+
+    Args:
+        file_jar (string): Apache Tika app JAR
+        memory_allocation (string): memory for every worker
+        workers (int): number of warm workers
+        address (string): Unix domain socket of daemon
+    """
+    server = create_server(file_jar, memory_allocation, workers, address)
+    log.info("Daemon listening on {!r}".format(server.server_address))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close_server(server)
@@ -17,7 +17,9 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-__all__ = ["TikaAppError", "TikaAppJarError", "TikaAppFilePathError"]
+__all__ = [
+    "TikaAppError", "TikaAppJarError", "TikaAppFilePathError",
+    "TikaAppDaemonError", "TikaAppOutOfMemoryError", "TikaAppTimeoutError"]
 
 
 class TikaAppError(Exception):
@@ -30,3 +32,15 @@ class TikaAppJarError(TikaAppError):
 
 class TikaAppFilePathError(TikaAppError):
     pass
+
+
+class TikaAppDaemonError(TikaAppError):
+    pass
+
+
+class TikaAppOutOfMemoryError(TikaAppError):
+    pass
+
+
+class TikaAppTimeoutError(TikaAppError):
+    pass
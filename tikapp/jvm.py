@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from __future__ import unicode_literals
+
+import hashlib
+import logging
+import os
+import subprocess
+import tempfile
+
+import six
+
+from .exceptions import TikaAppError
+from .utils import jar_fingerprint
+
+
+log = logging.getLogger(__name__)
+
+
+# Named profiles of JVM flags, given before -jar
+JVM_PROFILES = {
+    "default": [],
+    "fast-startup": [
+        "-XX:TieredStopAtLevel=1",
+        "-XX:+UseSerialGC",
+        "-Xshare:auto",
+    ],
+}
+
+# Small document parsed to load the classes to archive
+CDS_TRAINING = b"Apache Tika class data sharing training document.\n"
+
+# Marker files of CDS archives that failed to build in this process
+_cds_failures = set()
+
+
+def jvm_flags(profile):
+    """
+    Return the JVM flags of profile.
+
+    Args:
+        profile (string/list): name of profile or list of flags
+
+    Returns:
+        list of flags
+    """
+    if not profile:
+        return []
+
+    if isinstance(profile, six.string_types):
+        try:
+            return list(JVM_PROFILES[profile])
+        except KeyError:
+            msg = "JVM profile {!r} not valid".format(profile)
+            log.exception(msg)
+            raise TikaAppError(msg)
+
+    return list(profile)
+
+
+def cds_archive_path(directory, file_jar, flags=None):
+    """
+    Return the path of Class Data Sharing archive of Tika app Jar.
+    The name depends on the fingerprint of Jar and on JVM flags.
+
+    Args:
+        directory (string): directory of CDS archives
+        file_jar (string): path of Tika app Jar
+        flags (list): JVM flags
+
+    Returns:
+        path of archive (string)
+    """
+    h = hashlib.sha256()
+    h.update(jar_fingerprint(file_jar).encode("utf-8"))
+    h.update("\0".join(flags or []).encode("utf-8"))
+    return os.path.join(
+        directory, "tika-app-{}.jsa".format(h.hexdigest()[:16]))
+
+
+def java_binary():
+    """Return the real path of java in PATH ("java" if not found). """
+    for directory in os.environ.get("PATH", "").split(os.pathsep):
+        path = os.path.join(directory, "java")
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return os.path.realpath(path)
+    return "java"
+
+
+def cds_failure_path(archive, java=None):
+    """
+    Return the path of marker file of an archive that failed to build
+    with the given java binary (i.e. a JVM without
+    -XX:ArchiveClassesAtExit). Another java binary tries again.
+
+    Args:
+        archive (string): path of archive
+        java (string): path of java binary (default the one in PATH)
+
+    Returns:
+        path of marker file (string)
+    """
+    java = java or java_binary()
+    h = hashlib.sha256(java.encode("utf-8"))
+
+    try:
+        st = os.stat(java)
+    except OSError:
+        pass
+    else:
+        h.update("\0{}\0{}".format(st.st_size, st.st_mtime).encode("utf-8"))
+
+    return "{}-{}.failed".format(
+        os.path.splitext(archive)[0], h.hexdigest()[:16])
+
+
+def cds_archive(directory, file_jar, flags=None, training=None):
+    """
+    Return the path of Class Data Sharing archive of Tika app Jar, built
+    the first time. A failed build is recorded for the Jar and the java
+    binary, in memory and in a marker file, and it's not tried again.
+
+    Args:
+        directory (string): directory of CDS archives
+        file_jar (string): path of Tika app Jar
+        flags (list): JVM flags
+        training (list): paths of files to parse in the training run
+
+    Returns:
+        path of archive (string), None if it can't be built
+    """
+    archive = cds_archive_path(directory, file_jar, flags)
+    if os.path.exists(archive):
+        return archive
+
+    failure = cds_failure_path(archive)
+    if failure in _cds_failures or os.path.exists(failure):
+        return None
+
+    if build_cds_archive(archive, file_jar, flags, training):
+        return archive
+
+    _cds_failures.add(failure)
+    try:
+        open(failure, "wb").close()
+    except (IOError, OSError):
+        log.debug("Marker file {!r} not written".format(failure))
+
+    return None
+
+
+def build_cds_archive(archive, file_jar, flags=None, training=None):
+    """
+    Build a dynamic AppCDS archive (Java >= 13) running Tika app on
+    training files. The archive is written in a temp file and renamed
+    at the end, so concurrent builds are safe.
+
+    Args:
+        archive (string): path of archive
+        file_jar (string): path of Tika app Jar
+        flags (list): JVM flags
+        training (list): paths of files to parse in the training run.
+                         If None a small text is parsed
+
+    Returns:
+        True if the archive was built
+    """
+    directory = os.path.dirname(archive)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    fd, temp = tempfile.mkstemp(dir=directory, suffix=".jsa.tmp")
+    os.close(fd)
+    os.remove(temp)
+
+    command = ["java"] + list(flags or [])
+    command.append("-XX:ArchiveClassesAtExit={}".format(temp))
+    command.extend(["-jar", file_jar, "-eUTF-8", "-J", "-t"])
+    command.extend(training or [])
+
+    log.debug("Build CDS archive: {}".format(", ".join(command)))
+
+    with open(os.devnull, "wb") as devnull:
+        out = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=devnull,
+            stderr=devnull)
+        out.communicate(None if training else CDS_TRAINING)
+
+    if out.returncode or not os.path.exists(temp):
+        log.warning("CDS archive not built (needs Java >= 13)")
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        return False
+
+    os.rename(temp, archive)
+    return True
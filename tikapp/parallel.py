@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from __future__ import unicode_literals
+
+import collections
+import logging
+import threading
+import time
+
+from six.moves import queue
+
+
+log = logging.getLogger(__name__)
+
+
+MapResult = collections.namedtuple(
+    "MapResult", ["index", "input", "result", "error", "elapsed"])
+
+
+def _worker(func, tasks, results):
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+
+        index, item = task
+        start = time.time()
+        result, error = None, None
+
+        try:
+            result = func(item)
+        except Exception as e:
+            log.debug("Error on input {}: {!r}".format(index, e))
+            error = e
+
+        results.put(MapResult(index, item, result, error, time.time() - start))
+
+
+def imap(func, inputs, workers=4, ordered=True, in_flight=None):
+    """
+    Apply func to every input with a pool of threads. The inputs are
+    consumed lazily: at most in_flight of them are submitted and not yet
+    yielded. Exceptions of func are returned in the results.
+
+    Args:
+        func (function): function to apply to every input
+        inputs (iterable): inputs, also a generator
+        workers (int): number of threads
+        ordered (boolean): If True yield the results in order of inputs
+        in_flight (int): max inputs in flight (default two per thread)
+
+    Returns:
+        Generator of MapResult (index, input, result, error, elapsed)
+    """
+    in_flight = in_flight or workers * 2
+    tasks = queue.Queue()
+    results = queue.Queue()
+    threads = []
+
+    for _ in range(workers):
+        t = threading.Thread(target=_worker, args=(func, tasks, results))
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    inputs = iter(inputs)
+    exhausted = False
+    submitted = 0
+    received = 0
+    yielded = 0
+    buffered = {}
+
+    try:
+        while True:
+            while not exhausted and submitted - yielded < in_flight:
+                try:
+                    item = next(inputs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                tasks.put((submitted, item))
+                submitted += 1
+
+            if received == submitted:
+                break
+
+            result = results.get()
+            received += 1
+
+            if not ordered:
+                yielded += 1
+                yield result
+                continue
+
+            buffered[result.index] = result
+            while yielded in buffered:
+                result = buffered.pop(yielded)
+                yielded += 1
+                yield result
+
+    finally:
+        # Drop the tasks not started yet and stop the threads
+        while True:
+            try:
+                tasks.get_nowait()
+            except queue.Empty:
+                break
+
+        for _ in threads:
+            tasks.put(None)
@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from __future__ import unicode_literals
+
+import atexit
+import errno
+import logging
+import os
+import socket
+import subprocess
+import threading
+import time
+
+import six
+
+from .backends import TikaBackend
+from .exceptions import TikaAppError
+from .utils import (
+    CHUNK_SIZE,
+    binary_stream,
+    iter_stream,
+    replayable,
+    stream_position,
+)
+
+
+log = logging.getLogger(__name__)
+
+
+def free_port():
+    """Return a free TCP port on localhost. """
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+    finally:
+        s.close()
+
+
+class TikaWorker(object):
+    """
+    A long-lived Tika app JVM started in server mode. The output switches
+    (-t, -j, -d, ...) are fixed when the JVM starts, so a worker can only
+    serve the requests with the same switches.
+    """
+
+    def __init__(
+        self,
+        file_jar,
+        switches,
+        memory_allocation=None,
+        max_jobs=None,
+        start_timeout=60,
+        jvm_options=None,
+    ):
+        self.file_jar = file_jar
+        self.jvm_options = list(jvm_options or [])
+        self.switches = tuple(switches)
+        self.memory_allocation = memory_allocation
+        self.max_jobs = max_jobs
+        self.start_timeout = start_timeout
+        self.jobs = 0
+        self.port = None
+        self._process = None
+        self._started = None
+
+    def __repr__(self):  # pragma: no cover
+        class_name = type(self).__name__
+        return "{}({!r}, {!r}, port={!r})".format(
+            class_name, self.file_jar, self.switches, self.port)
+
+    @property
+    def alive(self):
+        return self._process is not None and self._process.poll() is None
+
+    @property
+    def exhausted(self):
+        return bool(self.max_jobs) and self.jobs >= self.max_jobs
+
+    def start(self):
+        self.port = free_port()
+        command = ["java"] + self.jvm_options
+        if self.memory_allocation:
+            command.append("-Xmx{}".format(self.memory_allocation))
+        command.extend(["-jar", self.file_jar, "-eUTF-8"])
+        command.extend(self.switches)
+        command.extend(["--server", "--port={}".format(self.port)])
+
+        log.debug("Start worker: {}".format(", ".join(command)))
+
+        with open(os.devnull, "r+b") as devnull:
+            self._process = subprocess.Popen(
+                command, stdin=devnull, stdout=devnull, stderr=devnull)
+
+        self._started = time.time()
+        self.jobs = 0
+
+    def stop(self):
+        if self._process is None:
+            return
+
+        log.debug("Stop worker on port {}".format(self.port))
+
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+        self._process = None
+
+    def _connect(self, timeout):
+        """Connect to the JVM, waiting for it during the start. """
+        while True:
+            if not self.alive:
+                raise TikaAppError("Tika worker is dead")
+
+            try:
+                return socket.create_connection(
+                    ("127.0.0.1", self.port), timeout=timeout)
+            except socket.error as e:
+                if e.errno != errno.ECONNREFUSED:
+                    raise
+                if time.time() - self._started > self.start_timeout:
+                    raise TikaAppError("Tika worker did not start")
+                time.sleep(0.1)
+
+    def process(self, path=None, objectInput=None, timeout=None, chunks=None):
+        """
+        Submit a file, a file object or chunks of bytes to the worker.
+
+        Args:
+            path (string): Path of file to analyze
+            objectInput (object): file object/standard input to analyze
+            timeout (float): seconds to wait on the socket
+            chunks (iterable): chunks of bytes to analyze
+
+        Returns:
+            Standard output data of Tika app (bytes)
+        """
+        conn = self._connect(timeout)
+        self.jobs += 1
+
+        try:
+            if path:
+                with open(path, "rb") as f:
+                    self._send(conn, iter_stream(f))
+            elif chunks is not None:
+                self._send(conn, chunks)
+            else:
+                self._send(conn, iter_stream(binary_stream(objectInput)))
+            conn.shutdown(socket.SHUT_WR)
+
+            chunks = []
+            while True:
+                chunk = conn.recv(CHUNK_SIZE)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            return b"".join(chunks)
+
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _send(conn, chunks):
+        for chunk in chunks:
+            conn.sendall(chunk)
+
+
+class TikaWorkerPool(TikaBackend):
+    """
+    Pool of warm Tika app JVMs. Every request is sent to an idle worker
+    started with the same switches. Workers that crash or wedge are
+    replaced, and every worker is recycled after max_jobs requests.
+    """
+
+    def __init__(
+        self,
+        file_jar,
+        size=2,
+        memory_allocation=None,
+        max_jobs=None,
+        timeout=300,
+        jvm_options=None,
+    ):
+        self.file_jar = file_jar
+        self.jvm_options = jvm_options
+        self.size = size
+        self.memory_allocation = memory_allocation
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._idle = {}
+        self._count = 0
+        self._closed = False
+        atexit.register(self.close)
+
+    def __repr__(self):  # pragma: no cover
+        class_name = type(self).__name__
+        return "{}({!r}, size={!r}, max_jobs={!r})".format(
+            class_name, self.file_jar, self.size, self.max_jobs)
+
+    def _new_worker(self, switches):
+        worker = TikaWorker(
+            file_jar=self.file_jar,
+            switches=switches,
+            memory_allocation=self.memory_allocation,
+            max_jobs=self.max_jobs,
+            jvm_options=self.jvm_options)
+        worker.start()
+        return worker
+
+    def _acquire(self, switches):
+        victim = None
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise TikaAppError("Tika worker pool is closed")
+
+                idle = self._idle.get(switches)
+                if idle:
+                    return idle.pop()
+
+                if self._count < self.size:
+                    self._count += 1
+                    break
+
+                # Replace an idle worker started with other switches
+                others = [w for w in six.itervalues(self._idle) if w]
+                if others:
+                    victim = others[0].pop(0)
+                    break
+
+                self._cond.wait()
+
+        if victim:
+            victim.stop()
+
+        try:
+            return self._new_worker(switches)
+        except Exception:
+            self._discard()
+            raise
+
+    def _discard(self):
+        with self._cond:
+            self._count -= 1
+            self._cond.notify()
+
+    def _release(self, worker, broken=False):
+        if broken or worker.exhausted or not worker.alive or self._closed:
+            worker.stop()
+            self._discard()
+            return
+
+        with self._cond:
+            self._idle.setdefault(worker.switches, []).append(worker)
+            self._cond.notify()
+
+    def supports(self, switches):
+        """
+        Tika app server mode gives only the plain output type on its
+        socket: the recursive JSON (-J) needs a JVM for every call.
+        """
+        return "-J" not in switches
+
+    def process(self, switches, path=None, objectInput=None, chunks=None):
+        """
+        Submit a file, a file object or chunks of bytes to an idle worker.
+        Only the inputs that can be read again are retried if the worker
+        crashes.
+
+        Args:
+            switches (list): list of switches to Tika app Jar
+            path (string): Path of file to analyze
+            objectInput (object): file object/standard input to analyze
+            chunks (iterable): chunks of bytes to analyze
+
+        Returns:
+            Standard output data of Tika app (bytes)
+        """
+        switches = tuple(switches)
+
+        position = None
+        if not path and chunks is None:
+            position = stream_position(objectInput)
+        attempts = 2 if replayable(path, objectInput, chunks) else 1
+
+        for attempt in range(attempts):
+            if attempt and position is not None:
+                binary_stream(objectInput).seek(position)
+
+            worker = self._acquire(switches)
+            try:
+                result = worker.process(
+                    path, objectInput, self.timeout, chunks)
+            except socket.timeout:
+                log.warning("Tika worker on port {} wedged".format(
+                    worker.port))
+                self._release(worker, broken=True)
+                raise TikaAppError("Tika worker timed out")
+            except (socket.error, TikaAppError):
+                log.warning("Tika worker on port {} crashed".format(
+                    worker.port))
+                self._release(worker, broken=True)
+                if attempt + 1 == attempts:
+                    raise TikaAppError("Tika worker crashed")
+            else:
+                self._release(worker)
+                return result
+
+    def warm(self, switches, count=1):
+        """
+        Start workers with the given switches and keep them idle for the
+        next requests.
+
+        Args:
+            switches (list): list of switches to Tika app Jar
+            count (int): number of workers, at most the size of pool
+        """
+        switches = tuple(switches)
+        workers = [self._acquire(switches)
+                   for _ in range(min(count, self.size))]
+
+        for worker in workers:
+            self._release(worker)
+
+    def close(self):
+        """Stop all idle workers. Busy workers stop when released. """
+        with self._cond:
+            self._closed = True
+            workers = [w for idle in six.itervalues(self._idle) for w in idle]
+            self._idle = {}
+            self._count -= len(workers)
+            self._cond.notify_all()
+
+        for worker in workers:
+            worker.stop()
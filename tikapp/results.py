@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from __future__ import unicode_literals
+
+import codecs
+import collections
+import re
+
+import six
+
+from .utils import nfc
+
+try:
+    import simplejson as json
+except ImportError:  # pragma: no cover
+    import json
+
+
+CONTENT_KEY = "X-TIKA:content"
+
+LANGUAGE_KEYS = ("language", "dc:language", "Content-Language")
+
+# First byte that is not ASCII whitespace (also a byte of UTF-8 sequence)
+NOT_SPACE = re.compile(br"[^ \t\n\r\x0b\x0c]")
+
+
+Analysis = collections.namedtuple(
+    "Analysis",
+    ["content_type", "content", "language", "metadata", "embedded"])
+
+
+def parse_analysis(documents):
+    """
+    Build an Analysis from the output of Tika app -J -t.
+
+    Args:
+        documents (list): recursive JSON of Tika app converted in object
+
+    Returns:
+        Analysis: content type (without parameters), text content,
+        language (None if Tika did not give it), metadata and the
+        list of embedded documents
+    """
+    if not documents:
+        return Analysis(None, None, None, {}, [])
+
+    metadata = dict(documents[0])
+    content = (metadata.pop(CONTENT_KEY, None) or "").strip()
+
+    content_type = metadata.get("Content-Type")
+    if content_type:
+        content_type = content_type.split(";")[0].strip().lower()
+
+    language = None
+    for key in LANGUAGE_KEYS:
+        if metadata.get(key):
+            language = metadata[key]
+            break
+
+    return Analysis(content_type, content, language, metadata, documents[1:])
+
+
+# Sentinel of JSON not parsed yet (None is a valid JSON)
+_NOT_PARSED = object()
+
+
+@six.python_2_unicode_compatible
+class TikaResult(object):
+    """
+    Output of Tika app that is decoded (UTF-8), stripped and normalized
+    (NFC) only the first time its text is used, and parsed only the first
+    time its JSON is used. The raw output is in attribute raw (bytes).
+    """
+
+    __slots__ = ("raw", "_text", "_json")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._text = None
+        self._json = _NOT_PARSED
+
+    def __repr__(self):  # pragma: no cover
+        return "TikaResult({} bytes)".format(len(self.raw))
+
+    def __str__(self):
+        return self.text
+
+    def __bool__(self):
+        # Scan the raw output, without decoding it (i.e. a spilled mmap)
+        return NOT_SPACE.search(self.raw) is not None
+
+    __nonzero__ = __bool__
+
+    @property
+    def text(self):
+        """Decoded, stripped and normalized output (unicode). """
+        if self._text is None:
+            # It decodes also the mmap of spilled outputs without copies
+            text = codecs.utf_8_decode(self.raw, "strict", True)[0]
+            self._text = nfc(text.strip())
+        return self._text
+
+    @property
+    def json(self):
+        """Output converted in object. None if the output is empty. """
+        if self._json is _NOT_PARSED:
+            self._json = json.loads(self.text) if self else None
+        return self._json
+
+
+class TikaFileResult(TikaResult):
+    """
+    Output of Tika app bigger than spill_size, spilled in an anonymous
+    temp file. The attribute raw is its read-only mmap, that can also be
+    read in chunks like a file. The text is decoded only when used.
+    """
+
+    __slots__ = ("_position",)
+
+    def __init__(self, raw):
+        super(TikaFileResult, self).__init__(raw)
+        self._position = 0
+
+    def __repr__(self):  # pragma: no cover
+        return "TikaFileResult({} bytes)".format(len(self.raw))
+
+    @property
+    def mmap(self):
+        """Read-only mmap of output. """
+        return self.raw
+
+    def read(self, size=-1):
+        """Read up to size bytes (all if negative) of raw output. """
+        start = self._position
+        end = len(self.raw) if size is None or size < 0 else start + size
+
+        data = self.raw[start:end]
+        self._position += len(data)
+        return data
+
+    def seek(self, position):
+        """Change the position of read. """
+        self._position = position
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from __future__ import unicode_literals
+
+import io
+import logging
+import mmap
+import re
+import struct
+import zipfile
+
+
+log = logging.getLogger(__name__)
+
+HEAD_SIZE = 8192
+
+ZIP = "zip"
+OLE2 = "ole2"
+RIFF = "riff"
+
+# offset 0 signatures: magic bytes, content type (or container)
+SIGNATURES = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"\x1f\x8b", "application/gzip"),
+    (b"BZh", "application/x-bzip2"),
+    (b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (b"Rar!\x1a\x07", "application/x-rar-compressed"),
+    (b"\xfd7zXZ\x00", "application/x-xz"),
+    (b"{\\rtf", "application/rtf"),
+    (b"ID3", "audio/mpeg"),
+    (b"fLaC", "audio/x-flac"),
+    (b"PK\x03\x04", ZIP),
+    (b"PK\x05\x06", ZIP),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", OLE2),
+    (b"RIFF", RIFF),
+]
+
+RIFF_TYPES = {
+    b"WAVE": "audio/vnd.wave",
+    b"AVI ": "video/x-msvideo",
+    b"WEBP": "image/webp",
+}
+
+OOXML_TYPES = {
+    "application/vnd.openxmlformats-officedocument.wordprocessingml."
+    "document.main+xml":
+    "application/vnd.openxmlformats-officedocument.wordprocessingml."
+    "document",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml."
+    "sheet.main+xml":
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.openxmlformats-officedocument.presentationml."
+    "presentation.main+xml":
+    "application/vnd.openxmlformats-officedocument.presentationml."
+    "presentation",
+}
+
+# Entries that make a zip something more specific than application/zip
+ZIP_SPECIAL_ENTRIES = (
+    "[Content_Types].xml",
+    "mimetype",
+    "META-INF/",
+    "AndroidManifest.xml",
+    "classes.dex",
+    "Index/",
+    "doc.kml",
+)
+
+OLE2_STREAMS = [
+    ("WordDocument", "application/msword"),
+    ("Workbook", "application/vnd.ms-excel"),
+    ("Book", "application/vnd.ms-excel"),
+    ("PowerPoint Document", "application/vnd.ms-powerpoint"),
+    ("__substg1.0_", "application/vnd.ms-outlook"),
+]
+
+MAIL_HEADERS = (
+    b"return-path:",
+    b"received:",
+    b"delivered-to:",
+    b"message-id:",
+    b"mime-version:",
+    b"x-mailer:",
+)
+
+HEADER_LINE = re.compile(br"^[!-9;-~]+:[ \t]")
+
+
+def _build_index(signatures):
+    """Index the signatures by first byte, longest magic bytes first. """
+    index = {}
+    for magic, content_type in signatures:
+        index.setdefault(magic[:1], []).append((magic, content_type))
+    for candidates in index.values():
+        candidates.sort(key=lambda i: len(i[0]), reverse=True)
+    return index
+
+
+INDEX = _build_index(SIGNATURES)
+
+
+def detect(path=None, data=None):
+    """
+    Detect the content type of a file or a buffer from magic bytes, in pure
+    Python. It answers only when the signature is not ambiguous, else it
+    returns None and the caller should ask to Tika app.
+
+    Args:
+        path (string): path of file to analyze
+        data (bytes): bytes, bytearray, memoryview or mmap to analyze
+
+    Returns:
+        content type (string) or None if it's ambiguous
+    """
+    if path:
+        with open(path, "rb") as f:
+            head = f.read(HEAD_SIZE)
+            return _detect(head, lambda: f)
+
+    if isinstance(data, mmap.mmap):
+        return _detect(data[:HEAD_SIZE], lambda: data)
+
+    def open_stream():
+        # The buffer is copied only to sniff zip and OLE2 containers
+        if isinstance(data, bytes):
+            return io.BytesIO(data)
+        return io.BytesIO(memoryview(data).tobytes())
+
+    return _detect(memoryview(data)[:HEAD_SIZE].tobytes(), open_stream)
+
+
+def _detect(head, open_stream):
+    """
+    Args:
+        head (bytes): first bytes of input
+        open_stream (function): return a seekable binary file object of
+                                all input, called only for containers
+
+    Returns:
+        content type (string) or None if it's ambiguous
+    """
+    for magic, content_type in INDEX.get(head[:1], []):
+        if not head.startswith(magic):
+            continue
+
+        try:
+            if content_type == ZIP:
+                return _detect_zip(open_stream())
+            elif content_type == OLE2:
+                return _detect_ole2(head, open_stream())
+            elif content_type == RIFF:
+                return RIFF_TYPES.get(head[8:12])
+        except Exception as e:
+            log.debug("Error sniffing container: {!r}".format(e))
+            return None
+
+        return content_type
+
+    if _is_mail(head):
+        return "message/rfc822"
+
+    return None
+
+
+def _detect_zip(stream):
+    stream.seek(0)
+    z = zipfile.ZipFile(stream)
+    names = z.namelist()
+
+    if "mimetype" in names:
+        content_type = z.read("mimetype").decode("ascii").strip()
+        if content_type.startswith("application/vnd.oasis.opendocument.") \
+                or content_type == "application/epub+zip":
+            return content_type
+        return None
+
+    if "[Content_Types].xml" in names:
+        types = z.read("[Content_Types].xml").decode("utf-8", "replace")
+        found = [v for k, v in OOXML_TYPES.items() if k in types]
+        return found[0] if len(found) == 1 else None
+
+    for name in names:
+        if name.startswith(ZIP_SPECIAL_ENTRIES):
+            return None
+
+    return "application/zip"
+
+
+def _detect_ole2(head, stream):
+    """Look for the main stream in the first sector of directory. """
+    sector_size = 1 << struct.unpack("<H", head[30:32])[0]
+    directory = struct.unpack("<I", head[48:52])[0]
+
+    stream.seek((directory + 1) * sector_size)
+    sector = stream.read(sector_size)
+
+    names = []
+    for i in range(0, len(sector) - 127, 128):
+        length = struct.unpack("<H", sector[i + 64:i + 66])[0]
+        if 2 <= length <= 64:
+            names.append(sector[i:i + length - 2].decode("utf-16-le"))
+
+    for stream_name, content_type in OLE2_STREAMS:
+        if any(n.startswith(stream_name) for n in names):
+            return content_type
+
+    return None
+
+
+def _is_mail(head):
+    """Headers of mail at the beginning, and a known one in first line. """
+    lines = head.split(b"\n", 3)[:3]
+    if len(lines) < 3 or not lines[0].lower().startswith(MAIL_HEADERS):
+        return False
+    return all(HEADER_LINE.match(line) or line[:1] in (b" ", b"\t")
+               for line in lines[:2])
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from __future__ import unicode_literals
+
+import logging
+import threading
+
+from .exceptions import TikaAppTimeoutError
+
+
+log = logging.getLogger(__name__)
+
+
+class _Call(object):
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Coalesce the concurrent calls with the same key: the first caller runs
+    the function, the others wait for it and share its result (or its
+    exception). Nothing is kept after the call ends.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def __repr__(self):  # pragma: no cover
+        class_name = type(self).__name__
+        return "{}(calls={!r}, coalesced={!r})".format(
+            class_name, self.calls, self.coalesced)
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._in_flight)}
+
+    def do(self, key, func, timeout=None):
+        """
+        Run func, or wait for the running call with the same key.
+
+        Args:
+            key (string): key of call
+            func (function): function without arguments
+            timeout (float): max seconds to wait for the running call
+
+        Returns:
+            The result of func
+        """
+        with self._lock:
+            call = self._in_flight.get(key)
+
+            if call is None:
+                self.calls += 1
+                call = self._in_flight[key] = _Call()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            log.debug("Call {} coalesced".format(key))
+            if not call.done.wait(timeout):
+                raise TikaAppTimeoutError(
+                    "Timed out waiting for the coalesced call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
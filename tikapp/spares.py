@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from __future__ import unicode_literals
+
+import atexit
+import logging
+import subprocess
+import threading
+
+import six
+
+from .timeouts import session_options
+
+
+log = logging.getLogger(__name__)
+
+
+class TikaSpares(object):
+    """
+    Pre-started Tika app JVMs waiting on standard input. When a request
+    takes a spare, it has already loaded its classes, and a new spare is
+    started at once, so the start-up of JVM overlaps with the request.
+    The spares are kept for every group of switches already used.
+    """
+
+    def __init__(self, command, size=1):
+        """
+        Args:
+            command (function): given the switches, returns the command
+                                line of Tika app
+            size (int): number of spares for every group of switches
+        """
+        self.command = command
+        self.size = size
+        self._spares = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close)
+
+    def __repr__(self):  # pragma: no cover
+        class_name = type(self).__name__
+        return "{}(size={!r})".format(class_name, self.size)
+
+    def _spawn(self, switches):
+        command = self.command(list(switches))
+        log.debug("Start spare: {}".format(", ".join(command)))
+
+        # Standard error is read by TikaApp when the spare is taken
+        return subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            **session_options())
+
+    def take(self, switches):
+        """
+        Return a started JVM waiting on standard input, or None if there
+        isn't one ready, and start the spares for next requests.
+
+        Args:
+            switches (list): list of switches to Tika app Jar
+
+        Returns:
+            subprocess.Popen or None
+        """
+        switches = tuple(switches)
+        spare = None
+
+        with self._lock:
+            if self._closed:
+                return None
+
+            spares = self._spares.setdefault(switches, [])
+
+            # Discard the JVMs dead while waiting
+            for dead in [s for s in spares if s.poll() is not None]:
+                spares.remove(dead)
+                self._stop(dead)
+
+            if spares:
+                spare = spares.pop(0)
+
+            while len(spares) < self.size:
+                spares.append(self._spawn(switches))
+
+        return spare
+
+    @staticmethod
+    def _stop(process):
+        if process.poll() is None:
+            process.kill()
+        for stream in (process.stdin, process.stdout, process.stderr):
+            try:
+                stream.close()
+            except (IOError, OSError):
+                pass
+        process.wait()
+
+    def close(self):
+        """Stop all spares. """
+        with self._lock:
+            self._closed = True
+            spares = [s for i in six.itervalues(self._spares) for s in i]
+            self._spares = {}
+
+        for spare in spares:
+            self._stop(spare)
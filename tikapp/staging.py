@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from __future__ import unicode_literals
+
+import atexit
+import logging
+import os
+import tempfile
+import threading
+
+
+log = logging.getLogger(__name__)
+
+
+# tmpfs, so that the staged payloads never touch the disk
+TMPFS_DIR = "/dev/shm"
+
+# Memory files up to this size are kept for the next payloads
+STAGING_REUSE_SIZE = 8 * 1024 * 1024
+
+
+def tmpfs_dir():
+    """Return a tmpfs directory for temp files, None if not available. """
+    if os.path.isdir(TMPFS_DIR) and os.access(TMPFS_DIR, os.W_OK):
+        return TMPFS_DIR
+
+
+def memfd_available():
+    """Return True if the payloads can be staged in memory files. """
+    return hasattr(os, "memfd_create") and os.path.isdir("/proc/self/fd")
+
+
+def _write_all(fd, chunks):
+    written = 0
+
+    for chunk in chunks:
+        while chunk:
+            n = os.write(fd, chunk)
+            chunk = chunk[n:]
+            written += n
+
+    return written
+
+
+class Staging(object):
+    """
+    Stage payloads in files that the JVM can open, without disk I/O.
+    On Linux the payloads go in memory files (memfd), opened by the JVM
+    as /proc/<pid>/fd/<fd>, elsewhere in tmpfs or in the temp directory.
+    The released memory files are kept, up to max_free, and rewritten for
+    the next payloads. The file descriptors are closed at release, or at
+    exit for the kept ones.
+    """
+
+    def __init__(self, max_free=4, reuse_size=STAGING_REUSE_SIZE):
+        """
+        Args:
+            max_free (int): max number of memory files kept for reuse
+            reuse_size (int): max size of a memory file kept for reuse
+        """
+        self.max_free = max_free
+        self.reuse_size = reuse_size
+        self.memfd = memfd_available()
+        self._lock = threading.Lock()
+        self._free = []
+        self._staged = {}
+        atexit.register(self.close)
+
+    def __repr__(self):  # pragma: no cover
+        class_name = type(self).__name__
+        return "{}(max_free={!r}, memfd={!r})".format(
+            class_name, self.max_free, self.memfd)
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {"staged": len(self._staged), "free": len(self._free)}
+
+    def stage(self, chunks):
+        """
+        Write chunks of bytes in a staged file.
+
+        Args:
+            chunks (iterable): chunks of bytes
+
+        Returns:
+            Path of staged file
+        """
+        if self.memfd:
+            return self._stage_memfd(chunks)
+
+        fd, path = tempfile.mkstemp(dir=tmpfs_dir())
+        log.debug("Stage payload in {!r}".format(path))
+
+        try:
+            _write_all(fd, chunks)
+        except Exception:
+            os.close(fd)
+            os.remove(path)
+            raise
+
+        os.close(fd)
+        with self._lock:
+            self._staged[path] = None
+        return path
+
+    def _stage_memfd(self, chunks):
+        with self._lock:
+            fd = self._free.pop() if self._free else None
+
+        if fd is None:
+            fd = os.memfd_create("tikapp")
+
+        try:
+            os.lseek(fd, 0, os.SEEK_SET)
+            size = _write_all(fd, chunks)
+            # A reused memory file can be longer than the payload
+            os.ftruncate(fd, size)
+        except Exception:
+            os.close(fd)
+            raise
+
+        path = "/proc/{}/fd/{}".format(os.getpid(), fd)
+        log.debug("Stage payload in {!r}".format(path))
+
+        with self._lock:
+            self._staged[path] = fd
+        return path
+
+    def release(self, path):
+        """
+        Release a staged file: a memory file is closed or kept for reuse,
+        a file in tmpfs is removed.
+
+        Args:
+            path (string): path of staged file
+
+        Returns:
+            True if the path was staged here
+        """
+        with self._lock:
+            if path not in self._staged:
+                return False
+
+            fd = self._staged.pop(path)
+
+            if fd is not None and len(self._free) < self.max_free:
+                try:
+                    keep = os.fstat(fd).st_size <= self.reuse_size
+                except OSError:
+                    keep = False
+
+                if keep:
+                    self._free.append(fd)
+                    return True
+
+        if fd is None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        else:
+            os.close(fd)
+
+        return True
+
+    def close(self):
+        """Close the memory files kept for reuse. """
+        with self._lock:
+            free, self._free = self._free, []
+
+        for fd in free:
+            os.close(fd)
+
+
+_staging = Staging()
+
+
+def stage(chunks):
+    """Write chunks of bytes in a staged file of process. """
+    return _staging.stage(chunks)
+
+
+def release(path):
+    """
+    Release a staged file of process. The other files are removed.
+
+    Args:
+        path (string): path of file
+    """
+    if not _staging.release(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -19,18 +19,68 @@ limitations under the License.
 
 from __future__ import unicode_literals
 
+import contextlib
 import logging
 import os
 import subprocess
+import threading
+import time
 
-import six
-from .exceptions import TikaAppJarError, TikaAppError
-from .utils import file_path, clean, sanitize
+import mmap
 
-try:
-    import simplejson as json
-except ImportError:  # pragma: no cover
-    import json
+import six
+from .admission import default_scheduler, parse_size
+from .batch import (
+    BATCH_MODES, batch_directories, read_results, remove_directories)
+from .bundle import (
+    BUNDLE_MAX_BYTES,
+    BUNDLE_MAX_COUNT,
+    iter_bundles,
+    split_documents,
+    write_bundle,
+)
+from .cache import TikaCache
+from .exceptions import (
+    TikaAppJarError,
+    TikaAppError,
+    TikaAppOutOfMemoryError,
+    TikaAppTimeoutError,
+)
+from .jvm import cds_archive, jvm_flags
+from .parallel import imap
+from .pool import TikaWorkerPool
+from .results import TikaFileResult, TikaResult, parse_analysis
+from .signatures import detect as detect_signature
+from .singleflight import SingleFlight
+from .spares import TikaSpares
+from .staging import release
+from .timeouts import (
+    RunStats,
+    Watchdog,
+    call_deadline,
+    remaining,
+    session_options,
+)
+from .utils import (
+    file_path,
+    clean,
+    file_sha256,
+    has_fileno,
+    iter_b64decode,
+    iter_buffer,
+    iter_stream,
+    iter_json_array,
+    iter_text,
+    binary_stream,
+    CHUNK_SIZE,
+    jar_fingerprint,
+    spill_stream,
+    spool_stream,
+    StreamTail,
+    Replayable,
+    replayable,
+    stream_position,
+)
 
 
 log = logging.getLogger(__name__)
@@ -38,15 +88,158 @@ log = logging.getLogger(__name__)
 
 class TikaApp(object):
 
-    def __init__(self, file_jar=None, memory_allocation=None):
+    def __init__(
+        self,
+        file_jar=None,
+        memory_allocation=None,
+        pool_size=None,
+        pool_max_jobs=None,
+        pool_timeout=300,
+        cache=None,
+        fast_detection=True,
+        jvm_profile=None,
+        cds_dir=None,
+        cds_training=None,
+        spares=None,
+        backend=None,
+        scheduler=None,
+        heap_ladder=None,
+        timeout=None,
+        deadline=None,
+        stats_hook=None,
+        lazy_results=False,
+        spill_size=None,
+        coalesce=False,
+    ):
+        """
+        Args:
+            file_jar (string): Path of Tika app Jar
+            memory_allocation (string): max heap size of JVM (-Xmx)
+            pool_size (int): if given, keep this number of warm JVMs
+                             and send them the requests
+            pool_max_jobs (int): recycle a warm JVM after these requests
+            pool_timeout (float): seconds after that a warm JVM is
+                                  considered wedged and restarted
+                                  (default 300, None to wait forever)
+            cache (TikaCache): if given, the outputs are cached and
+                               a hit doesn't start the JVM
+            fast_detection (boolean): If True detect_content_type answers
+                                      from magic bytes, when they are not
+                                      ambiguous, without the JVM
+            jvm_profile (string/list): name of JVM flags profile
+                                       (i.e. "fast-startup") or list
+                                       of JVM flags
+            cds_dir (string): if given, build (once) and use a Class Data
+                              Sharing archive of Jar in this directory
+            cds_training (list): files parsed to build the CDS archive
+            spares (int): if given, keep this number of JVMs started and
+                          waiting on standard input, for every group of
+                          switches used (payload, data, file objects).
+                          The idle spares are not charged to scheduler
+            backend (TikaBackend): if given, the calls are sent to this
+                                   backend (i.e. TikaServerBackend)
+                                   instead of starting a JVM
+            scheduler (MemoryScheduler): if given, the JVMs wait for room
+                                         in its memory budget (also the
+                                         streams and batch_extract, not
+                                         the pool and the idle spares).
+                                         Default is the process-wide
+                                         scheduler
+            heap_ladder (list): if given, a JVM out of memory is run again
+                                with the next bigger heap of the list,
+                                i.e. ["256m", "1g", "4g"]. Without
+                                memory_allocation, the first heap is
+                                the default
+            timeout (float): max seconds of every call. At expiry the JVM
+                             (with its process group) is killed and
+                             TikaAppTimeoutError is raised
+            deadline (float): time (time.time()) when all calls must end
+            stats_hook (function): called for every JVM run with a dict:
+                                   switches, elapsed, timed_out,
+                                   returncode
+            lazy_results (boolean): If True the contents and the JSON
+                                    not converted are returned as
+                                    TikaResult, that decodes and
+                                    normalizes the output only when used
+            spill_size (string/int): if given, an output of JVM bigger
+                                     than this (i.e. "64m") is written in
+                                     a temp file and returned as
+                                     TikaFileResult (mmap, read(n))
+            coalesce (boolean): If True the concurrent calls with the
+                                same input and switches run only one
+                                JVM. The file objects and the buffers
+                                are then staged, like with a cache
+        """
         self.file_jar = file_jar
         self.memory_allocation = memory_allocation
+        self.cache = cache
+        self.fast_detection = fast_detection
+        self.jvm_profile = jvm_profile
+        self.cds_dir = cds_dir
+        self.cds_training = cds_training
+        self.coalescing = SingleFlight()
+        self._jvm_options = None
+        self._jvm_lock = threading.Lock()
+        self._backend = backend
+        self._scheduler = scheduler
+        self.heap_ladder = heap_ladder
+        self.timeout = timeout
+        self.deadline = deadline
+        self.runs = RunStats(stats_hook)
+        self.lazy_results = lazy_results
+        self.spill_size = parse_size(spill_size) if spill_size else None
+        self.coalesce = coalesce
+        self._pool = None
+        self._spares = None
+
+        if spares:
+            self._spares = TikaSpares(self._command, spares)
+
+        if pool_size:
+            self._pool = TikaWorkerPool(
+                file_jar=self.file_jar,
+                size=pool_size,
+                memory_allocation=self.memory_allocation,
+                max_jobs=pool_max_jobs,
+                timeout=pool_timeout,
+                jvm_options=self.jvm_options)
 
     def __repr__(self):  # pragma: no cover
         class_name = type(self).__name__
         return "{}({!r}, {!r})".format(
             class_name, self.file_jar, self.memory_allocation)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close the backend and stop the warm JVMs and the spare ones. """
+        if self._backend is not None:
+            self._backend.close()
+
+        if self._pool is not None:
+            self._pool.close()
+
+        if self._spares is not None:
+            self._spares.close()
+
+    @property
+    def pool(self):
+        return self._pool
+
+    @property
+    def backend(self):
+        """The backend given, or the pool of warm JVMs, or None. """
+        return self._backend or self._pool
+
+    @property
+    def scheduler(self):
+        """The scheduler given, or the process-wide one, or None. """
+        return self._scheduler or default_scheduler()
+
     @property
     def file_jar(self):
         return self._file_jar
@@ -70,77 +263,505 @@ class TikaApp(object):
 
     @property
     def help(self):
-        return self._command_template(["--help"])
+        return self._command_template(["--help"]).text
+
+    @property
+    def jvm_options(self):
+        """
+        JVM flags of profile, plus the CDS archive if enabled. The archive
+        is built the first time it's needed, and never again after a
+        failed build with the same java.
+        """
+        with self._jvm_lock:
+            if self._jvm_options is None:
+                options = jvm_flags(self.jvm_profile)
 
-    @sanitize
-    def _command_template(self, switches, objectInput=None):
+                if self.cds_dir:
+                    archive = cds_archive(
+                        self.cds_dir, self.file_jar, options,
+                        self.cds_training)
+
+                    if archive is not None:
+                        options.append(
+                            "-XX:SharedArchiveFile={}".format(archive))
+
+                self._jvm_options = options
+
+            return list(self._jvm_options)
+
+    def _command(self, switches, memory_allocation=None):
+        """Return the command line of Tika app with given switches. """
+        memory_allocation = memory_allocation or self.memory_allocation
+        command = ["java"] + self.jvm_options
+        if memory_allocation:
+            command.append("-Xmx{}".format(memory_allocation))
+        command.extend(["-jar", self.file_jar, "-eUTF-8"])
+        command.extend(switches)
+        return command
+
+    def _command_template(
+        self,
+        switches,
+        objectInput=None,
+        path=None,
+        chunks=None,
+        timeout=None,
+        deadline=None,
+    ):
         """Template for Tika app commands
 
         Args:
             switches (list): list of switches to Tika app Jar
             objectInput (object): file object/standard input to analyze
+            path (string): path of file to analyze
+            chunks (iterable): chunks of bytes to write on standard input
+            timeout (float): max seconds of call (default of instance)
+            deadline (float): time when call must end (default of instance)
 
         Return:
-            Standard output data (unicode Python 2, str Python 3)
+            TikaResult of standard output data
         """
-        command = ["java", "-jar", self.file_jar, "-eUTF-8"]
-        if self.memory_allocation:
-            command.append("-Xmx{}".format(self.memory_allocation))
-        command.extend(switches)
+        deadline = self._call_deadline(timeout, deadline)
+
+        size = os.path.getsize(path) if path else None
+        has_input = path or objectInput or chunks
+
+        if not has_input or (self.cache is None and not self.coalesce):
+            # The input is streamed to the JVM, without copies
+            result, _ = self._execute(
+                switches, objectInput, path, chunks, size, deadline)
+            return self._result(result)
+
+        # The cache and the coalescing need the key of input: the streams
+        # are staged (and hashed) to be read again
+        staged = spooled = None
 
-        if not objectInput:
-            objectInput = subprocess.PIPE
+        try:
+            if path:
+                key = self._input_key(switches, path)
+            else:
+                staged, digest = spool_stream(objectInput, chunks)
+                size = os.path.getsize(staged)
+                key = self._input_key(switches, digest=digest)
+                spooled = open(staged, "rb")
 
-        log.debug("Subprocess command: {}".format(", ".join(command)))
+            def execute():
+                return self._cached_execute(
+                    key, switches, spooled, path, size, deadline)
 
-        if six.PY2:
-            with open(os.devnull, "w") as devnull:
-                out = subprocess.Popen(
-                    command,
-                    stdin=objectInput,
-                    stdout=subprocess.PIPE,
-                    stderr=devnull)
+            if self.coalesce:
+                result = self.coalescing.do(key, execute, remaining(deadline))
+            else:
+                result = execute()
+
+            return self._result(result)
+
+        finally:
+            if spooled is not None:
+                spooled.close()
+            if staged is not None:
+                release(staged)
+
+    def _call_deadline(self, timeout=None, deadline=None):
+        """Return the deadline of a call, with the defaults of instance. """
+        return call_deadline(
+            self.timeout if timeout is None else timeout,
+            self.deadline if deadline is None else deadline)
+
+    def _input_key(self, switches, path=None, digest=None):
+        """
+        Return the key of input for cache and coalescing. The cache needs
+        the SHA-256 of content; without cache a path is known by its real
+        path, size and mtime, without reading it.
+        """
+        if digest is None:
+            if self.cache is not None:
+                digest = file_sha256(path)
+            else:
+                st = os.stat(path)
+                digest = "{}:{}:{!r}".format(
+                    os.path.realpath(path), st.st_size, st.st_mtime)
+
+        return TikaCache.key(jar_fingerprint(self.file_jar), switches, digest)
+
+    def _cached_execute(
+        self,
+        key,
+        switches,
+        objectInput=None,
+        path=None,
+        size=None,
+        deadline=None,
+    ):
+        """
+        Look up the output in cache, run Tika app on miss. Only the
+        outputs of successful runs are cached: a failed or empty output
+        could be a transient failure.
+        """
+        result = self.cache.get_raw(key) if self.cache is not None else None
+
+        if result is None:
+            result, returncode = self._execute(
+                switches, objectInput, path, size=size, deadline=deadline)
+            # The spilled outputs are kept out of cache, like out of memory
+            if self.cache is not None and not returncode and not isinstance(
+                    result, mmap.mmap) and result.strip():
+                self.cache.set(key, result)
+
+        return result
+
+    def _execute(
+        self,
+        switches,
+        objectInput=None,
+        path=None,
+        chunks=None,
+        size=None,
+        deadline=None,
+    ):
+        """
+        Run Tika app (or the backend) and return its raw output and exit
+        status (0 for the backends, that return an empty output on
+        failure). With a scheduler, the JVM waits for room in the memory
+        budget and its heap is chosen by size of input. With a heap
+        ladder, a JVM out of memory is run again with a bigger heap, if
+        its input can be read again (path, buffer, payload or seekable
+        file object). The deadline is only for the JVMs started by
+        TikaApp, the backends have their own timeouts.
+        """
+        backend = self.backend
+        if backend is not None and backend.supports(switches) and (
+                path or objectInput or chunks):
+            return backend.process(switches, path, objectInput, chunks), 0
+
+        memory_allocation = self._heap(size)
+        retry = replayable(path, objectInput, chunks)
+
+        position = None
+        if retry and not path and chunks is None:
+            position = stream_position(objectInput)
+
+        while True:
+            if position is not None:
+                binary_stream(objectInput).seek(position)
+
+            try:
+                return self._admit_run(
+                    switches, objectInput, path, chunks, memory_allocation,
+                    deadline)
+
+            except TikaAppOutOfMemoryError:
+                bigger = self._next_heap(memory_allocation)
+                if bigger is None or not retry:
+                    raise
+
+                log.warning("Tika app out of memory with heap {}, run again "
+                            "with heap {}".format(memory_allocation, bigger))
+                memory_allocation = bigger
+
+    def _heap(self, size=None):
+        """Return the heap of JVM for an input of given size. """
+        memory_allocation = self.memory_allocation
+        if not memory_allocation and self.heap_ladder:
+            memory_allocation = self.heap_ladder[0]
+
+        scheduler = self.scheduler
+        if scheduler is not None:
+            memory_allocation = scheduler.heap(size, memory_allocation)
+
+        return memory_allocation
+
+    def _next_heap(self, memory_allocation):
+        """Return the next bigger heap of ladder, None if there isn't. """
+        current = parse_size(memory_allocation) if memory_allocation else 0
+
+        for heap in self.heap_ladder or []:
+            if parse_size(heap) > current:
+                return heap
+
+    def _admit_run(
+        self,
+        switches,
+        objectInput=None,
+        path=None,
+        chunks=None,
+        memory_allocation=None,
+        deadline=None,
+    ):
+        """Run Tika app when the scheduler, if any, admits it. """
+        with self._admitted(memory_allocation, deadline):
+            return self._run(
+                switches, objectInput, path, chunks, memory_allocation,
+                deadline)
+
+    @contextlib.contextmanager
+    def _admitted(self, memory_allocation=None, deadline=None):
+        """
+        Wait until the scheduler, if any, admits a JVM and charge it
+        until the block ends.
+        """
+        scheduler = self.scheduler
+        if scheduler is None:
+            yield
+            return
+
+        with scheduler.admit(
+                memory_allocation or scheduler.default_heap, deadline):
+            yield
+
+    def _run(
+        self,
+        switches,
+        objectInput=None,
+        path=None,
+        chunks=None,
+        memory_allocation=None,
+        deadline=None,
+    ):
+        """
+        Start Tika app and return its raw output (bytes, or mmap if it was
+        spilled in a temp file) and its exit status. An OutOfMemoryError
+        on standard error raises TikaAppOutOfMemoryError. The other
+        failures are only logged, because Tika app can fail after a
+        partial output. At deadline the process group of JVM is killed
+        and TikaAppTimeoutError is raised.
+        """
+        if deadline is not None and time.time() >= deadline:
+            raise TikaAppTimeoutError("Deadline expired before Tika app")
+
+        start = time.time()
+        out, feeder, stderr = self._popen(
+            switches, objectInput, path, chunks, memory_allocation)
+        watchdog = Watchdog(out, deadline)
+
+        try:
+            if feeder is None and out.stdin:
+                out.stdin.close()
+
+            if self.spill_size:
+                stdoutdata = spill_stream(out.stdout, self.spill_size)
+            else:
+                stdoutdata = out.stdout.read()
+            out.stdout.close()
+            out.wait()
+            if feeder is not None:
+                feeder.join()
+        finally:
+            watchdog.cancel()
+
+        stderrdata = stderr.read().decode("utf-8", "replace")
+        elapsed = time.time() - start
+        self.runs.record(
+            switches, elapsed, watchdog.expired, out.returncode)
+
+        if watchdog.expired:
+            msg = "Tika app killed at deadline after {:.1f}s".format(elapsed)
+            log.error(msg)
+            raise TikaAppTimeoutError(msg)
+
+        if "java.lang.OutOfMemoryError" in stderrdata:
+            msg = "Tika app out of memory (exit status {}, heap {})".format(
+                out.returncode, memory_allocation or "default")
+            log.error(msg)
+            raise TikaAppOutOfMemoryError(msg)
+
+        if out.returncode:
+            log.warning("Tika app exit status {}: {}".format(
+                out.returncode, stderrdata.strip()[-1000:]))
+
+        return stdoutdata, out.returncode
+
+    def _popen(
+        self,
+        switches,
+        objectInput=None,
+        path=None,
+        chunks=None,
+        memory_allocation=None,
+    ):
+        """
+        Start Tika app, or take a spare one for standard input. The chunks
+        are written on its standard input by a thread. The spares are
+        taken only with the heap of instance.
+
+        Returns:
+            tuple: process, thread that writes the chunks (or None),
+            StreamTail of standard error
+        """
+        # File objects without file descriptor are streamed like chunks
+        if objectInput and not has_fileno(objectInput):
+            chunks = iter_stream(binary_stream(objectInput))
+            objectInput = None
+
+        out = None
+        if self._spares is not None and not path and (
+                objectInput or chunks is not None) and (
+                memory_allocation in (None, self.memory_allocation)):
+            out = self._spares.take(switches)
+
+        if out is not None:
+            if objectInput:
+                chunks = iter_stream(binary_stream(objectInput))
+
+        else:
+            command = self._command(switches, memory_allocation)
+            if path:
+                command.append(path)
+
+            if not objectInput:
+                objectInput = subprocess.PIPE
+
+            log.debug("Subprocess command: {}".format(", ".join(command)))
 
-        elif six.PY3:
             out = subprocess.Popen(
                 command,
                 stdin=objectInput,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.DEVNULL)
+                stderr=subprocess.PIPE,
+                **session_options())
+
+        stderr = StreamTail(out.stderr)
 
-        stdoutdata, _ = out.communicate()
-        return stdoutdata.decode("utf-8").strip()
+        feeder = None
+        if chunks is not None:
+            feeder = threading.Thread(target=self._feed, args=(out, chunks))
+            feeder.daemon = True
+            feeder.start()
+
+        return out, feeder, stderr
+
+    @staticmethod
+    def _feed(out, chunks):
+        """Write chunks on standard input of process. """
+        try:
+            for chunk in chunks:
+                out.stdin.write(chunk)
+        except (IOError, OSError, ValueError) as e:
+            # The JVM exited (or was killed) without reading all input
+            log.debug("Error writing on standard input: {!r}".format(e))
+        finally:
+            try:
+                out.stdin.close()
+            except (IOError, OSError):
+                pass
+
+    def _stdin_template(
+        self,
+        switches,
+        path=None,
+        payload=None,
+        objectInput=None,
+        data=None,
+        timeout=None,
+        deadline=None,
+    ):
+        """
+        Analyze file object, payload and data from standard input, without
+        temp files. It returns the tuple of clean decorator, with the
+        TikaResult of output.
+        """
+        limits = {"timeout": timeout, "deadline": deadline}
+
+        if objectInput:
+            result = self._command_template(switches, objectInput, **limits)
+            return result, True, None
+
+        elif payload:
+            result = self._command_template(
+                switches, chunks=Replayable(iter_b64decode, payload),
+                **limits)
+            return result, True, None
+
+        elif data is not None and not path:
+            result = self._command_template(
+                switches, chunks=Replayable(iter_buffer, data), **limits)
+            return result, True, None
+
+        f = file_path(path, payload, objectInput)
+        result = self._command_template(switches, path=f, **limits)
+        return result, path, f
 
     def generic(self, switches=["--help"]):
         """Generic method. Default display help"""
-        return self._command_template(switches)
+        return self._command_template(switches).text
+
+    @staticmethod
+    def _result(raw):
+        """Wrap the raw output: bytes, or mmap of spilled output. """
+        if isinstance(raw, mmap.mmap):
+            return TikaFileResult(raw)
+        return TikaResult(raw)
+
+    def _output(self, result):
+        """
+        The TikaResult if lazy results are enabled or the output was
+        spilled, else its text.
+        """
+        if self.lazy_results or isinstance(result, TikaFileResult):
+            return result
+        return result.text
 
     @clean
-    def detect_content_type(self, path=None, payload=None, objectInput=None):
+    def detect_content_type(
+        self,
+        path=None,
+        payload=None,
+        objectInput=None,
+        data=None,
+        timeout=None,
+        deadline=None,
+    ):
         """
         Return the content type of passed file or payload.
+        If fast_detection is enabled, the magic bytes are checked in pure
+        Python before, and Tika app runs only if they are ambiguous.
 
         Args:
             path (string): Path of file to analyze
             payload (string): Payload base64 to analyze
             objectInput (object): file object/standard input to analyze
+            data (bytes): bytes, bytearray, memoryview or mmap to analyze
+            timeout (float): max seconds of call (default of instance)
+            deadline (float): time when call must end (default of instance)
 
         Returns:
             content type of file (string)
         """
-        # From Python detection content type from stdin doesn't work TO FIX
-        if objectInput:
-            message = "Detection content type with file object is not stable."
-            log.exception(message)
-            raise TikaAppError(message)
+        if self.fast_detection and data is not None and not path:
+            result = detect_signature(data=data)
+            if result:
+                return result, True, None
+
+        # File object is written on disk, detection from stdin isn't stable
+        f = file_path(path, payload, objectInput, data)
+
+        try:
+            result = detect_signature(path=f) if self.fast_detection else None
+
+            if not result:
+                switches = ["-d"]
+                result = self._command_template(
+                    switches, path=f, timeout=timeout,
+                    deadline=deadline).text.lower()
+
+        except Exception:
+            # The clean decorator doesn't get the staged file
+            if not path:
+                release(f)
+            raise
 
-        f = file_path(path, payload, objectInput)
-        switches = ["-d", f]
-        result = self._command_template(switches).lower()
         return result, path, f
 
     @clean
-    def extract_only_content(self, path=None, payload=None, objectInput=None):
+    def extract_only_content(
+        self,
+        path=None,
+        payload=None,
+        objectInput=None,
+        data=None,
+        timeout=None,
+        deadline=None,
+    ):
         """
         Return only the text content of passed file.
         These parameters are in OR. Only one of them can be analyzed.
@@ -149,22 +770,237 @@ class TikaApp(object):
             path (string): Path of file to analyze
             payload (string): Payload base64 to analyze
             objectInput (object): file object/standard input to analyze
+            data (bytes): bytes, bytearray, memoryview or mmap to analyze
+            timeout (float): max seconds of call (default of instance)
+            deadline (float): time when call must end (default of instance)
 
         Returns:
-            text of file passed (string)
+            text of file passed (string, or TikaResult with lazy results
+            or spilled output)
+        """
+        result, given_path, f = self._stdin_template(
+            ["-t"], path, payload, objectInput, data, timeout, deadline)
+        return self._output(result), given_path, f
+
+    def iter_content(
+        self,
+        path=None,
+        payload=None,
+        objectInput=None,
+        data=None,
+        max_chars=None,
+        max_bytes=None,
+        chunk_size=CHUNK_SIZE,
+        timeout=None,
+        deadline=None,
+    ):
+        """
+        Like extract_only_content, but yield the text in chunks as soon as
+        Tika app writes it. When max_chars or max_bytes are reached the
+        JVM is killed. It always starts a new JVM. The timeout counts
+        from the call and includes the time of the consumer.
+
+        Args:
+            path (string): Path of file to analyze
+            payload (string): Payload base64 to analyze
+            objectInput (object): file object/standard input to analyze
+            data (bytes): bytes, bytearray, memoryview or mmap to analyze
+            max_chars (int): stop after these characters of text
+            max_bytes (int): stop after these bytes of standard output
+            chunk_size (int): max bytes read from standard output at once
+            timeout (float): max seconds of call (default of instance)
+            deadline (float): time when call must end (default of instance)
+
+        Returns:
+            Generator of text chunks (string)
+        """
+        deadline = self._call_deadline(timeout, deadline)
+        objectInput, path, chunks = self._stream_input(
+            path, payload, objectInput, data)
+        return self._iter_content(
+            objectInput, path, chunks, max_chars, max_bytes, chunk_size,
+            deadline)
+
+    def _stream_input(self, path, payload, objectInput, data):
+        """
+        Return objectInput, path and chunks to give to Tika app, so that
+        payload and data are streamed on standard input.
         """
+        chunks = None
+
         if objectInput:
-            switches = ["-t"]
-            result = self._command_template(switches, objectInput)
-            return result, True, None
+            pass
+        elif payload:
+            chunks = iter_b64decode(payload)
+        elif data is not None and not path:
+            chunks = iter_buffer(data)
         else:
-            f = file_path(path, payload)
-            switches = ["-t", f]
-            result = self._command_template(switches)
-            return result, path, f
+            path = file_path(path, payload, objectInput)
+
+        return objectInput, path, chunks
+
+    def _iter_stdout(
+        self,
+        switches,
+        objectInput=None,
+        path=None,
+        chunks=None,
+        max_bytes=None,
+        chunk_size=CHUNK_SIZE,
+        deadline=None,
+    ):
+        """
+        Start Tika app and yield its standard output in chunks. If the
+        generator is closed before the end of output, the JVM is killed.
+        With a scheduler, the JVM waits for room in its memory budget.
+        At the end of output, an OutOfMemoryError on standard error raises
+        TikaAppOutOfMemoryError, like in _run. At deadline the process
+        group of JVM is killed and TikaAppTimeoutError is raised.
+        """
+        if deadline is not None and time.time() >= deadline:
+            raise TikaAppTimeoutError("Deadline expired before Tika app")
+
+        # The JVM is charged to scheduler until the end of output
+        with self._admitted(self.memory_allocation, deadline):
+            start = time.time()
+            out, feeder, stderr = self._popen(
+                switches, objectInput, path, chunks)
+            watchdog = Watchdog(out, deadline)
+            fd = out.stdout.fileno()
+            eof = False
+            read = 0
+
+            try:
+                while max_bytes is None or read < max_bytes:
+                    size = chunk_size
+                    if max_bytes is not None:
+                        size = min(size, max_bytes - read)
+
+                    chunk = os.read(fd, size)
+                    if not chunk:
+                        eof = True
+                        break
+
+                    read += len(chunk)
+                    yield chunk
+
+            finally:
+                watchdog.cancel()
+                if not eof and out.poll() is None:
+                    log.debug("Kill Tika app after {} bytes".format(read))
+                    out.kill()
+
+                out.stdout.close()
+                out.wait()
+                if feeder is not None:
+                    feeder.join()
+                stderrdata = stderr.read().decode("utf-8", "replace")
+                elapsed = time.time() - start
+                self.runs.record(
+                    switches, elapsed, watchdog.expired, out.returncode)
+
+        if watchdog.expired:
+            msg = "Tika app killed at deadline after {:.1f}s".format(elapsed)
+            log.error(msg)
+            raise TikaAppTimeoutError(msg)
+
+        if not eof:
+            return
+
+        if "java.lang.OutOfMemoryError" in stderrdata:
+            msg = "Tika app out of memory (exit status {}, heap {})".format(
+                out.returncode, self.memory_allocation or "default")
+            log.error(msg)
+            raise TikaAppOutOfMemoryError(msg)
+
+        if out.returncode:
+            log.warning("Tika app exit status {}: {}".format(
+                out.returncode, stderrdata.strip()[-1000:]))
+
+    def _iter_content(
+        self,
+        objectInput,
+        path,
+        chunks,
+        max_chars,
+        max_bytes,
+        chunk_size,
+        deadline,
+    ):
+        stdout = self._iter_stdout(
+            ["-t"], objectInput, path, chunks, max_bytes, chunk_size,
+            deadline)
+
+        try:
+            count = 0
+            for text in iter_text(stdout):
+                if max_chars is not None and count + len(text) >= max_chars:
+                    yield text[:max_chars - count]
+                    return
+                count += len(text)
+                yield text
+
+        finally:
+            stdout.close()
+
+    def iter_all_content(
+        self,
+        path=None,
+        payload=None,
+        objectInput=None,
+        data=None,
+        chunk_size=CHUNK_SIZE,
+        timeout=None,
+        deadline=None,
+    ):
+        """
+        Like extract_all_content with convert_to_obj, but parse the JSON
+        of Tika app incrementally and yield every document (container and
+        embedded) as soon as it is complete. The memory used depends on
+        the largest document, not on the whole container.
+        It always starts a new JVM. The timeout counts from the call and
+        includes the time of the consumer.
+
+        Args:
+            path (string): Path of file to analyze
+            payload (string): Payload base64 to analyze
+            objectInput (object): file object/standard input to analyze
+            data (bytes): bytes, bytearray, memoryview or mmap to analyze
+            chunk_size (int): max bytes read from standard output at once
+            timeout (float): max seconds of call (default of instance)
+            deadline (float): time when call must end (default of instance)
+
+        Returns:
+            Generator of dicts with metadata and content
+        """
+        deadline = self._call_deadline(timeout, deadline)
+        objectInput, path, chunks = self._stream_input(
+            path, payload, objectInput, data)
+        return self._iter_all_content(
+            objectInput, path, chunks, chunk_size, deadline)
+
+    def _iter_all_content(
+            self, objectInput, path, chunks, chunk_size, deadline):
+        stdout = self._iter_stdout(
+            ["-J", "-t"], objectInput, path, chunks, chunk_size=chunk_size,
+            deadline=deadline)
+
+        try:
+            for document in iter_json_array(stdout):
+                yield document
+        finally:
+            stdout.close()
 
     @clean
-    def detect_language(self, path=None, payload=None, objectInput=None):
+    def detect_language(
+        self,
+        path=None,
+        payload=None,
+        objectInput=None,
+        data=None,
+        timeout=None,
+        deadline=None,
+    ):
         """
         This function returns the language of passed file or payload.
 
@@ -172,19 +1008,16 @@ class TikaApp(object):
             path (string): Path of file to analyze
             payload (string): Payload base64 to analyze
             objectInput (object): file object/standard input to analyze
+            data (bytes): bytes, bytearray, memoryview or mmap to analyze
+            timeout (float): max seconds of call (default of instance)
+            deadline (float): time when call must end (default of instance)
 
         Returns:
             language of file (string)
         """
-        if objectInput:
-            switches = ["-l"]
-            result = self._command_template(switches, objectInput)
-            return result, True, None
-        else:
-            f = file_path(path, payload)
-            switches = ["-l", f]
-            result = self._command_template(switches)
-            return result, path, f
+        result, given_path, f = self._stdin_template(
+            ["-l"], path, payload, objectInput, data, timeout, deadline)
+        return result.text, given_path, f
 
     @clean
     def extract_all_content(
@@ -194,6 +1027,9 @@ class TikaApp(object):
         objectInput=None,
         pretty_print=False,
         convert_to_obj=False,
+        data=None,
+        timeout=None,
+        deadline=None,
     ):
         """
         This function returns a JSON of all contents and
@@ -206,17 +1042,22 @@ class TikaApp(object):
             pretty_print (boolean): If True adds newlines and whitespace,
                                     for better readability
             convert_to_obj (boolean): If True convert JSON in object
+            data (bytes): bytes, bytearray, memoryview or mmap to analyze
+            timeout (float): max seconds of call (default of instance)
+            deadline (float): time when call must end (default of instance)
         """
-        f = file_path(path, payload, objectInput)
-        switches = ["-J", "-t", "-r", f]
+        switches = ["-J", "-t", "-r"]
         if not pretty_print:
             switches.remove("-r")
-        result = self._command_template(switches)
+        result, given_path, f = self._stdin_template(
+            switches, path, payload, objectInput, data, timeout, deadline)
 
-        if result and convert_to_obj:
-            result = json.loads(result, encoding="utf-8")
+        if convert_to_obj and result:
+            result = result.json
+        else:
+            result = self._output(result)
 
-        return result, path, f
+        return result, given_path, f
 
     @clean
     def extract_only_metadata(
@@ -226,6 +1067,9 @@ class TikaApp(object):
         objectInput=None,
         pretty_print=False,
         convert_to_obj=False,
+        data=None,
+        timeout=None,
+        deadline=None,
     ):
         """
         This function returns a JSON of metadata of passed file
@@ -237,14 +1081,256 @@ class TikaApp(object):
             pretty_print (boolean): If True adds newlines and whitespace,
                                     for better readability
             convert_to_obj (boolean): If True convert JSON in object
+            data (bytes): bytes, bytearray, memoryview or mmap to analyze
+            timeout (float): max seconds of call (default of instance)
+            deadline (float): time when call must end (default of instance)
         """
-        f = file_path(path, payload, objectInput)
-        switches = ["-j", "-r", f]
+        switches = ["-j", "-r"]
         if not pretty_print:
             switches.remove("-r")
-        result = self._command_template(switches)
+        result, given_path, f = self._stdin_template(
+            switches, path, payload, objectInput, data, timeout, deadline)
 
-        if result and convert_to_obj:
-            result = json.loads(result, encoding="utf-8")
+        if convert_to_obj and result:
+            result = result.json
+        else:
+            result = self._output(result)
 
-        return result, path, f
+        return result, given_path, f
+
+    def analyze(
+        self,
+        path=None,
+        payload=None,
+        objectInput=None,
+        language_fallback=False,
+        data=None,
+        timeout=None,
+        deadline=None,
+    ):
+        """
+        Return content type, text, language and metadata of passed file
+        with only one call of Tika app (-J -t).
+
+        Args:
+            path (string): Path of file to analyze
+            payload (string): Payload base64 to analyze
+            objectInput (object): file object/standard input to analyze
+            language_fallback (boolean): If True and Tika doesn't give the
+                                         language in metadata, detect it
+                                         with another call
+            data (bytes): bytes, bytearray, memoryview or mmap to analyze
+            timeout (float): max seconds of call (default of instance)
+            deadline (float): time when call must end (default of instance)
+
+        Returns:
+            Analysis (content_type, content, language, metadata, embedded)
+        """
+        # The timeout is for all calls of analysis
+        deadline = call_deadline(
+            self.timeout if timeout is None else timeout,
+            self.deadline if deadline is None else deadline)
+
+        result = parse_analysis(self.extract_all_content(
+            path, payload, objectInput, convert_to_obj=True, data=data,
+            deadline=deadline))
+
+        if not result.language and language_fallback and result.content:
+            language = self._detect_language_text(result.content, deadline)
+            result = result._replace(language=language)
+
+        return result
+
+    def extract_many(
+        self,
+        payloads,
+        max_bytes=BUNDLE_MAX_BYTES,
+        max_count=BUNDLE_MAX_COUNT,
+    ):
+        """
+        Analyze many small payloads with few JVMs: the payloads are packed
+        in zips (bundles) on tmpfs and every zip is analyzed with only one
+        call of Tika app (-J -t). The documents are mapped back to their
+        payloads by entry name. If a bundle fails, its payloads are
+        analyzed one by one.
+
+        Args:
+            payloads (iterable): base64 payloads or buffers (bytes,
+                                 bytearray, memoryview, mmap)
+            max_bytes (int): max total size of the payloads of a bundle
+            max_count (int): max number of payloads of a bundle
+
+        Returns:
+            Generator, in order of payloads, of lists of documents (the
+            output of extract_all_content with convert_to_obj)
+        """
+        for bundle in iter_bundles(payloads, max_bytes, max_count):
+            if len(bundle) == 1:
+                yield self.extract_all_content(
+                    data=bundle[0], convert_to_obj=True)
+                continue
+
+            for raw, documents in zip(bundle, self._extract_bundle(bundle)):
+                if not documents:
+                    documents = self.extract_all_content(
+                        data=raw, convert_to_obj=True)
+                yield documents
+
+    def _extract_bundle(self, bundle):
+        """Analyze a bundle of raw payloads with one call of Tika app. """
+        path = write_bundle(bundle)
+
+        try:
+            documents = self.extract_all_content(
+                path=path, convert_to_obj=True)
+        except (TikaAppError, ValueError):
+            log.warning("Bundle of {} payloads failed, analyze them "
+                        "one by one".format(len(bundle)))
+            return [None] * len(bundle)
+        finally:
+            os.remove(path)
+
+        return split_documents(documents, len(bundle))
+
+    def _detect_language_text(self, text, deadline=None):
+        """Detect the language of text already extracted. """
+        return self._command_template(
+            ["-l"], chunks=Replayable(iter_buffer, text.encode("utf-8")),
+            deadline=deadline).text
+
+    MAP_METHODS = (
+        "detect_content_type",
+        "extract_only_content",
+        "detect_language",
+        "extract_all_content",
+        "extract_only_metadata",
+        "analyze",
+    )
+
+    def _map_call(self, method, item, kwargs):
+        """Call method on an input of map: path, buffer or kwargs. """
+        kwargs = dict(kwargs)
+
+        if isinstance(item, dict):
+            kwargs.update(item)
+        elif isinstance(item, six.string_types):
+            kwargs["path"] = item
+        elif isinstance(item, (bytes, bytearray, memoryview, mmap.mmap)):
+            kwargs["data"] = item
+        else:
+            raise TikaAppError("Input of type {!r} not valid".format(
+                type(item).__name__))
+
+        return getattr(self, method)(**kwargs)
+
+    def map(
+        self,
+        inputs,
+        method="extract_only_content",
+        workers=4,
+        ordered=True,
+        in_flight=None,
+        **kwargs
+    ):
+        """
+        Analyze many inputs with a pool of threads. Every input is a path,
+        a buffer (bytes, bytearray, memoryview, mmap) or a dict of arguments
+        of method (i.e. {"payload": ...}).
+        The inputs are consumed lazily, so they can come from a generator.
+
+        Args:
+            inputs (iterable): inputs to analyze
+            method (string): method of TikaApp to call for every input
+            workers (int): number of calls running together
+            ordered (boolean): If True yield the results in order of inputs
+            in_flight (int): max inputs submitted and not yet yielded
+            kwargs: other arguments of method (i.e. convert_to_obj)
+
+        Returns:
+            Generator of MapResult (index, input, result, error, elapsed)
+        """
+        if method not in self.MAP_METHODS:
+            msg = "Method {!r} not valid".format(method)
+            log.exception(msg)
+            raise TikaAppError(msg)
+
+        def func(item):
+            return self._map_call(method, item, kwargs)
+
+        return imap(func, inputs, workers, ordered, in_flight)
+
+    def imap_unordered(
+        self,
+        inputs,
+        method="extract_only_content",
+        workers=4,
+        in_flight=None,
+        **kwargs
+    ):
+        """
+        Like map, but yield the results as soon as they are ready.
+        """
+        return self.map(
+            inputs, method, workers, False, in_flight, **kwargs)
+
+    def batch_extract(
+        self,
+        paths_or_dir,
+        output_dir=None,
+        mode="text",
+        workers=None,
+    ):
+        """
+        Analyze many files with only one JVM, using Tika app batch mode.
+
+        Args:
+            paths_or_dir (string/list): directory (recursive) or
+                                        list of files to analyze
+            output_dir (string): where Tika app writes the outputs.
+                                 If None a temp directory is used
+                                 and removed at the end
+            mode (string): "text" (-t), "metadata" (-j) or "all" (-J -t)
+            workers (int): number of parsing threads of Tika app
+
+        Returns:
+            Generator of BatchResult (path, output_path, content, error),
+            content is a string for "text" and an object for
+            "metadata" and "all"
+        """
+        if mode not in BATCH_MODES:
+            msg = "Batch mode {!r} not valid".format(mode)
+            log.exception(msg)
+            raise TikaAppError(msg)
+
+        return self._batch_extract(paths_or_dir, output_dir, mode, workers)
+
+    def _batch_extract(self, paths_or_dir, output_dir, mode, workers):
+        input_dir, output_dir, mapping, temps = batch_directories(
+            paths_or_dir, output_dir)
+
+        try:
+            command = ["java"] + self.jvm_options
+            command.extend(["-jar", self.file_jar])
+            if self.memory_allocation:
+                command.append("-JXmx{}".format(self.memory_allocation))
+            command.extend(BATCH_MODES[mode][0])
+            if workers:
+                command.extend(["-numConsumers", str(workers)])
+            command.extend(["-i", input_dir, "-o", output_dir])
+
+            log.debug("Subprocess command: {}".format(", ".join(command)))
+
+            with open(os.devnull, "r+b") as devnull, self._admitted(
+                    self.memory_allocation):
+                returncode = subprocess.call(
+                    command, stdin=devnull, stdout=devnull, stderr=devnull)
+
+            if returncode:
+                log.warning("Tika batch exited with code {}".format(
+                    returncode))
+
+            for result in read_results(mapping, output_dir, mode):
+                yield result
+
+        finally:
+            remove_directories(temps)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Copyright 2016 Fedele Mantuano (https://twitter.com/fedelemantuano)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+
+from __future__ import unicode_literals
+
+import logging
+import os
+import signal
+import threading
+import time
+
+import six
+
+
+log = logging.getLogger(__name__)
+
+
+def call_deadline(timeout=None, deadline=None):
+    """
+    Return the deadline of a call: the nearest between its timeout and
+    its deadline.
+
+    Args:
+        timeout (float): seconds from now
+        deadline (float): time (time.time()) when the call must end
+
+    Returns:
+        Deadline (float), None if there isn't
+    """
+    if timeout is not None:
+        end = time.time() + timeout
+        deadline = end if deadline is None else min(deadline, end)
+    return deadline
+
+
+def remaining(deadline):
+    """Return the seconds left to deadline, None if there isn't. """
+    if deadline is not None:
+        return max(0, deadline - time.time())
+
+
+def session_options():
+    """
+    Return the options of subprocess.Popen to start a process in a new
+    process group, so that its children (i.e. tesseract started by Tika)
+    are killed with it.
+    """
+    if os.name != "posix":  # pragma: no cover
+        return {}
+    if six.PY2:  # pragma: no cover
+        return {"preexec_fn": os.setsid}
+    return {"start_new_session": True}
+
+
+def kill_process_group(process):
+    """Kill a process with its process group. """
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:  # pragma: no cover
+            process.kill()
+    except OSError:
+        # Already exited
+        pass
+
+
+class Watchdog(object):
+    """Kill the process group of a process if it's running at deadline. """
+
+    def __init__(self, process, deadline):
+        self.process = process
+        self.deadline = deadline
+        self.expired = False
+        self._timer = None
+
+        if deadline is not None:
+            self._timer = threading.Timer(remaining(deadline), self._expire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _expire(self):
+        if self.process.poll() is None:
+            log.warning("Kill Tika app (pid {}) at deadline".format(
+                self.process.pid))
+            self.expired = True
+            kill_process_group(self.process)
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+
+class RunStats(object):
+    """
+    Statistics of the JVMs run by TikaApp. If given, hook is called for
+    every run with a dict: switches, elapsed, timed_out, returncode.
+    """
+
+    def __init__(self, hook=None):
+        self.hook = hook
+        self.calls = 0
+        self.timed_out = 0
+        self.timed_out_elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def __repr__(self):  # pragma: no cover
+        class_name = type(self).__name__
+        return "{}(calls={!r}, timed_out={!r})".format(
+            class_name, self.calls, self.timed_out)
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "timed_out": self.timed_out,
+                "timed_out_elapsed": self.timed_out_elapsed}
+
+    def record(self, switches, elapsed, timed_out=False, returncode=None):
+        with self._lock:
+            self.calls += 1
+            if timed_out:
+                self.timed_out += 1
+                self.timed_out_elapsed += elapsed
+
+        if self.hook is not None:
+            try:
+                self.hook({
+                    "switches": list(switches),
+                    "elapsed": elapsed,
+                    "timed_out": timed_out,
+                    "returncode": returncode})
+            except Exception:
+                log.exception("Error in stats hook")
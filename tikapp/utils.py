@@ -19,62 +19,226 @@ limitations under the License.
 
 from __future__ import unicode_literals
 import base64
+import codecs
+import hashlib
 import logging
+import mmap
 import os
+import re
 import tempfile
-from unicodedata import normalize
+import threading
+from unicodedata import combining, normalize
+
+try:
+    from unicodedata import is_normalized
+except ImportError:  # pragma: no cover
+    is_normalized = None
 
 import six
 
 from .exceptions import TikaAppFilePathError
+from .staging import release, stage
+
+try:
+    import simplejson as json
+except ImportError:  # pragma: no cover
+    import json
 
 
 log = logging.getLogger(__name__)
 
+CHUNK_SIZE = 64 * 1024
+
+# Bytes of standard error of Tika app kept for the errors
+STDERR_TAIL_SIZE = 64 * 1024
+
+
+_jar_hashes = {}
+
+JSON_STRUCTURE = re.compile(r'[\[\]{}"]')
+JSON_STRING = re.compile(r'["\\]')
+
+
+def nfc(text):
+    """
+    Normalize the text in NFC, the normalization form recommended by W3C.
+    The text already normalized (almost all outputs of Tika app) is
+    returned as is, without a copy, on Python 3.8+.
+    """
+    if is_normalized is not None and is_normalized("NFC", text):
+        return text
+    return normalize("NFC", text)
+
 
 def sanitize(func):
     """ NFC is the normalization form recommended by W3C. """
 
     def wrapper(*args, **kwargs):
-        return normalize('NFC', func(*args, **kwargs))
+        return nfc(func(*args, **kwargs))
     return wrapper
 
 
+def nfc_boundary(text, i):
+    """
+    Return True if NFC can normalize text[:i] and text[i:] apart: text[i]
+    is a starter and doesn't compose with the characters before it. Only
+    two characters before are needed: Hangul L+V+T is the longest
+    composition of starters.
+    """
+    if combining(text[i]):
+        return False
+
+    head = text[max(i - 2, 0):i]
+    return nfc(head + text[i]) == nfc(head) + nfc(text[i])
+
+
+def iter_text(chunks):
+    """
+    Decode (UTF-8), strip and normalize (NFC) the chunks of standard output
+    incrementally. The joined text is the same of the sanitized output.
+    The trailing whitespaces and the characters after the last starter
+    that can't compose with the previous ones (i.e. combining marks and
+    Hangul jamo) are kept until the next chunk, to strip and normalize
+    them right.
+
+    Args:
+        chunks (iterable): chunks of standard output (bytes)
+
+    Returns:
+        Generator of text chunks (unicode)
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    started = False
+
+    for chunk in chunks:
+        text = pending + decoder.decode(chunk)
+
+        if not started:
+            text = text.lstrip()
+            started = bool(text)
+
+        i = len(text.rstrip()) - 1
+        while i > 0 and not nfc_boundary(text, i):
+            i -= 1
+
+        if i > 0:
+            yield nfc(text[:i])
+            pending = text[i:]
+        else:
+            pending = text
+
+    text = (pending + decoder.decode(b"", final=True)).rstrip()
+    if text:
+        yield nfc(text)
+
+
+def iter_json_array(chunks):
+    """
+    Parse incrementally a JSON array of objects (like the output of
+    Tika app -J) and yield every object as soon as it is complete.
+    Only the text of the current object is kept in memory.
+
+    Args:
+        chunks (iterable): chunks of JSON (UTF-8 bytes)
+
+    Returns:
+        Generator of objects
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    depth = 0
+    in_string = False
+    escaped = False
+    pieces = []
+    start = None
+
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if not text:
+            continue
+
+        pos = 0
+        if escaped:
+            # skip the character escaped at the end of previous chunk
+            pos = 1
+            escaped = False
+
+        while True:
+            if in_string:
+                m = JSON_STRING.search(text, pos)
+                if not m:
+                    break
+                if m.group() == "\\":
+                    if m.end() == len(text):
+                        escaped = True
+                        break
+                    pos = m.end() + 1
+                    continue
+                in_string = False
+                pos = m.end()
+                continue
+
+            m = JSON_STRUCTURE.search(text, pos)
+            if not m:
+                break
+
+            c = m.group()
+            pos = m.end()
+
+            if c == '"':
+                in_string = True
+
+            elif c in "[{":
+                depth += 1
+                if depth == 2:
+                    start = m.start()
+
+            else:
+                depth -= 1
+                if depth == 1 and start is not None:
+                    pieces.append(text[start:pos])
+                    yield json.loads("".join(pieces))
+                    pieces = []
+                    start = None
+
+        if start is not None:
+            pieces.append(text[start:])
+            start = 0
+
+
 def clean(func):
     """
-    This decorator removes the temp file from disk. This is the case where
+    This decorator releases the staged file. This is the case where
     you want to analyze from a payload.
     """
     def wrapper(*args, **kwargs):
         # tuple: output command, path given from command line,
-        # path of templ file when you give the payload
+        # path of staged file when you give the payload
         out, given_path, path = func(*args, **kwargs)
 
-        try:
-            if not given_path:
-                os.remove(path)
-        except OSError:
-            pass
+        if not given_path and path:
+            release(path)
 
         return out
 
     return wrapper
 
 
-def file_path(path=None, payload=None, objectInput=None):
+def file_path(path=None, payload=None, objectInput=None, data=None):
     """
-    Given a file path, payload or file object, it writes file on disk and
-    returns the temp path.
+    Given a file path, payload, file object or buffer, it writes file on
+    disk and returns the temp path.
 
     Args:
         path (string): path of real file
         payload(string): payload in base64 of file
         objectInput (object): file object/standard input to analyze
+        data (bytes): bytes, bytearray, memoryview or mmap to analyze
 
     Returns:
         Path of file
     """
-    f = path if path else write_payload(payload, objectInput)
+    f = path if path else write_payload(payload, objectInput, data)
 
     if not os.path.exists(f):
         msg = "File {!r} does not exist".format(f)
@@ -84,30 +248,302 @@ def file_path(path=None, payload=None, objectInput=None):
     return f
 
 
-def write_payload(payload=None, objectInput=None):
+def binary_stream(objectInput):
+    """
+    Return the binary stream of a file object. On Python 3 the standard
+    input and the files opened in text mode expose it as buffer.
+
+    Args:
+        objectInput (object): file object/standard input to analyze
+
+    Returns:
+        Binary file object
+    """
+    if six.PY3:
+        return getattr(objectInput, "buffer", objectInput)
+    return objectInput
+
+
+def write_payload(payload=None, objectInput=None, data=None):
     """
-    This function writes a base64 payload or file object on disk.
+    This function stages a base64 payload, file object or buffer in a
+    file: a memory file or tmpfs, if available. Release it with
+    staging.release.
 
     Args:
         payload (string): payload in base64
         objectInput (object): file object/standard input to analyze
+        data (bytes): bytes, bytearray, memoryview or mmap to analyze
 
     Returns:
         Path of file
     """
+    if not payload and not objectInput and data is None:
+        raise TypeError("Give a path, a payload, a file object or data")
 
-    temp = tempfile.mkstemp()[1]
-    log.debug("Write payload in temp file {!r}".format(temp))
+    if payload:
+        chunks = iter_b64decode(payload)
+    elif objectInput:
+        chunks = iter_stream(binary_stream(objectInput))
+    else:
+        chunks = iter_buffer(data)
 
-    with open(temp, 'wb') as f:
-        if payload:
-            payload = base64.b64decode(payload)
-        elif objectInput:
-            if six.PY3:
-                payload = objectInput.buffer.read()
-            elif six.PY2:
-                payload = objectInput.read()
+    return stage(chunks)
 
-        f.write(payload)
 
-    return temp
+class Replayable(object):
+    """
+    Chunks of an input that can be read again, i.e. to retry a request on
+    a new connection: every iteration calls func(*args) again.
+    """
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __repr__(self):  # pragma: no cover
+        return "{}({})".format(type(self).__name__, self.func.__name__)
+
+    def __iter__(self):
+        return iter(self.func(*self.args))
+
+
+def replayable(path=None, objectInput=None, chunks=None):
+    """
+    Return True if the input can be read again: a path, Replayable chunks
+    or a seekable file object (then the caller seeks it back to its
+    position).
+    """
+    if path or isinstance(chunks, Replayable):
+        return True
+
+    if chunks is None and objectInput is not None:
+        return stream_position(objectInput) is not None
+
+    return False
+
+
+def stream_position(objectInput):
+    """Return the position of a seekable file object, else None. """
+    stream = binary_stream(objectInput)
+    try:
+        # i.e. SpooledTemporaryFile hasn't seekable before Python 3.11
+        seekable = getattr(stream, "seekable", None)
+        if seekable is None or seekable():
+            return stream.tell()
+    except (AttributeError, IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def iter_b64decode(payload, size=CHUNK_SIZE):
+    """
+    Decode a base64 payload in chunks, so that the decoded payload is never
+    all in memory. The whitespaces (i.e. newlines of MIME) are skipped.
+
+    Args:
+        payload (string): payload in base64
+        size (int): size of chunks of payload
+
+    Returns:
+        Generator of decoded chunks (bytes)
+    """
+    if isinstance(payload, six.text_type):
+        payload = payload.encode("ascii")
+
+    rest = b""
+
+    for i in range(0, len(payload), size):
+        chunk = rest + b"".join(payload[i:i + size].split())
+        end = len(chunk) - len(chunk) % 4
+        rest = chunk[end:]
+        if end:
+            yield base64.b64decode(chunk[:end])
+
+    if rest:
+        yield base64.b64decode(rest)
+
+
+def iter_buffer(data, size=CHUNK_SIZE):
+    """
+    Return a generator of the chunks of a buffer (bytes, bytearray,
+    memoryview or mmap). The chunks are memoryview slices, so the buffer
+    is never copied.
+
+    Args:
+        data (bytes): buffer to analyze
+        size (int): size of chunks
+
+    Returns:
+        Generator of chunks
+    """
+    try:
+        view = memoryview(data)
+    except TypeError:  # pragma: no cover
+        # mmap on Python 2 doesn't support memoryview
+        view = data
+    else:
+        if six.PY3 and (view.format != "B" or view.ndim != 1):
+            view = view.cast("B")
+
+    for i in range(0, len(view), size):
+        yield view[i:i + size]
+
+
+def iter_stream(stream, size=CHUNK_SIZE):
+    """Return a generator of the chunks of a binary file object. """
+    return iter(lambda: stream.read(size), b"")
+
+
+def has_fileno(objectInput):
+    """Return True if file object is backed by a file descriptor. """
+    try:
+        objectInput.fileno()
+    except (AttributeError, IOError, OSError, ValueError):
+        return False
+    return True
+
+
+def file_sha256(path):
+    """Return the SHA-256 (hex) of file. """
+    h = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for chunk in iter_stream(f):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+def jar_sha256(path):
+    """
+    Return the SHA-256 (hex) of Tika app Jar. The hash is computed only
+    once for every size/mtime.
+
+    Args:
+        path (string): path of Tika app Jar
+
+    Returns:
+        SHA-256 (string)
+    """
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime)
+
+    if key not in _jar_hashes:
+        _jar_hashes[key] = file_sha256(path)
+
+    return _jar_hashes[key]
+
+
+def jar_fingerprint(path):
+    """
+    Return the fingerprint of Tika app Jar: size, mtime and SHA-256.
+
+    Args:
+        path (string): path of Tika app Jar
+
+    Returns:
+        Fingerprint (string)
+    """
+    st = os.stat(path)
+    return "{}:{}:{}".format(
+        st.st_size, int(st.st_mtime), jar_sha256(path))
+
+
+def spool_stream(objectInput=None, chunks=None):
+    """
+    Stage a file object (or chunks of bytes) in a memory file or on tmpfs
+    (see staging), computing its SHA-256.
+
+    Args:
+        objectInput (object): file object/standard input to analyze
+        chunks (iterable): chunks of bytes to analyze
+
+    Returns:
+        tuple: path of staged file (release it with staging.release),
+        SHA-256 (hex)
+    """
+    h = hashlib.sha256()
+
+    if chunks is None:
+        chunks = iter_stream(binary_stream(objectInput))
+
+    def hashed():
+        for chunk in chunks:
+            h.update(chunk)
+            yield chunk
+
+    path = stage(hashed())
+    return path, h.hexdigest()
+
+
+def spill_stream(stream, max_size):
+    """
+    Read a binary stream (i.e. standard output of Tika app) in memory up
+    to max_size bytes. Past it, the data is written in an anonymous temp
+    file, so a big output doesn't grow the memory of process.
+
+    Args:
+        stream (object): binary file object
+        max_size (int): max bytes kept in memory
+
+    Returns:
+        bytes, or a read-only mmap of temp file if the data was spilled
+    """
+    chunks = []
+    size = 0
+    temp = None
+
+    for chunk in iter_stream(stream):
+        if temp is not None:
+            temp.write(chunk)
+            continue
+
+        chunks.append(chunk)
+        size += len(chunk)
+
+        if size > max_size:
+            temp = tempfile.TemporaryFile()
+            for i in chunks:
+                temp.write(i)
+            chunks = None
+
+    if temp is None:
+        return b"".join(chunks)
+
+    try:
+        temp.flush()
+        return mmap.mmap(temp.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        # The map keeps the data of unlinked file
+        temp.close()
+
+
+class StreamTail(object):
+    """
+    Read a stream until its end with a thread, keeping only its last
+    bytes. Used for standard error of Tika app, so that the pipe never
+    fills up.
+    """
+
+    def __init__(self, stream, size=STDERR_TAIL_SIZE):
+        self.size = size
+        self._stream = stream
+        self._tail = b""
+        self._thread = threading.Thread(target=self._read)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _read(self):
+        try:
+            for chunk in iter(lambda: self._stream.read(4096), b""):
+                self._tail = (self._tail + chunk)[-self.size:]
+        except (IOError, OSError, ValueError):
+            pass
+        finally:
+            self._stream.close()
+
+    def read(self):
+        """Wait for the end of stream and return its last bytes. """
+        self._thread.join()
+        return self._tail